@@ -0,0 +1,99 @@
+"""
+Semantic cache of answered questions, shared by all sessions of a process.
+
+Farmers across a district ask the same handful of questions, each paying for
+retrieval, a Groq completion and translations. ``SemanticAnswerCache`` keeps
+the English answer and retrieved context of recent questions, keyed by the
+embedding of the English query. A new question whose embedding is at least
+``threshold`` cosine-similar to a cached one (normalised bge vectors, so a dot
+product) reuses that answer, together with every translation of it made so
+far.
+
+Entries are namespaced by model, knowledge base version and the query's
+region filter and entities (regions, soil parameters, crops), so switching
+model, hot-swapping the index or asking about another place or crop never
+serves an answer built from something else.
+Entries expire after ``ttl`` seconds and the least recently used are evicted
+beyond ``max_entries``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL = 24 * 3600
+# Paraphrases of one question score ~0.95+ with bge-small; different crops or places score lower
+ANSWER_CACHE_THRESHOLD = 0.95
+
+
+class CachedAnswer:
+    """An English answer, its context and its translations (language -> text)"""
+
+    def __init__(self, namespace: str, vector: np.ndarray, query: str, answer: str, context: list):
+        self.namespace = namespace
+        self.vector = vector
+        self.query = query
+        self.answer = answer
+        self.context = context
+        self.translations = {}
+        self.created_at = time.time()
+
+
+class SemanticAnswerCache:
+    """LRU + TTL cache of answers, looked up by query embedding similarity"""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for entry_id in [entry_id for entry_id, entry in self._entries.items() if entry.created_at < cutoff]:
+            del self._entries[entry_id]
+
+    def lookup(self, vector, namespace: str):
+        """The cached answer most similar to vector, if it reaches the threshold"""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._expire()
+            candidates = [
+                (entry_id, entry) for entry_id, entry in self._entries.items() if entry.namespace == namespace
+            ]
+            if candidates:
+                similarities = np.vstack([entry.vector for _, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, vector, namespace: str, query: str, answer: str, context: list) -> CachedAnswer:
+        entry = CachedAnswer(namespace, np.asarray(vector, dtype=np.float32), query, answer, context)
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,86 @@
+"""
+Token streaming of RAG answers to the UI.
+
+A Groq completion takes seconds, and until it is complete the page only
+shows a spinner. ``invoke_streaming`` runs the retrieval chain as usual -
+so the LLM response cache and the chain's ``answer``/``context`` output are
+unchanged - with a callback handler that receives every token the chat model
+streams (``ChatGroq(streaming=True)``). ``on_text`` is called with the answer
+so far as tokens arrive and the full response is returned at the end.
+
+The chain runs the LLM in worker threads, where Streamlit elements cannot be
+updated, so the chain is invoked on a background thread and its tokens are
+handed over through a queue to the calling (script) thread. Rendering is
+throttled to ``RENDER_INTERVAL`` seconds; a cached response arrives with no
+tokens and is returned at once.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Re-render the partial answer at most this often (seconds)
+RENDER_INTERVAL = 0.05
+
+_DONE = object()
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """Puts each streamed LLM token on a queue"""
+
+    def __init__(self, tokens: queue.Queue):
+        self.tokens = tokens
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.tokens.put(token)
+
+
+def invoke_streaming(chain, inputs: dict, on_text: Callable[[str], None],
+                     render_interval: float = RENDER_INTERVAL, config: dict = None) -> dict:
+    """chain.invoke(inputs, config), calling on_text(answer so far) while the answer streams"""
+    tokens = queue.Queue()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["response"] = chain.invoke(
+                inputs, config={**(config or {}), "callbacks": [TokenQueueHandler(tokens)]}
+            )
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            tokens.put(_DONE)
+
+    worker = threading.Thread(target=run, name="answer-stream", daemon=True)
+    worker.start()
+
+    parts, rendered, last_render = [], 0, 0.0
+    while True:
+        token = tokens.get()
+        if token is _DONE:
+            break
+        parts.append(token)
+        # Take whatever else has arrived before rendering once
+        while True:
+            try:
+                token = tokens.get_nowait()
+            except queue.Empty:
+                break
+            if token is _DONE:
+                tokens.put(_DONE)
+                break
+            parts.append(token)
+        now = time.monotonic()
+        if now - last_render >= render_interval:
+            on_text("".join(parts))
+            rendered, last_render = len(parts), now
+    worker.join()
+
+    if "error" in outcome:
+        raise outcome["error"]
+    if len(parts) > rendered:
+        on_text("".join(parts))
+    return outcome["response"]
@@ -1,8 +1,7 @@
 import streamlit as st
+import logging
 import os
 import time
-import json
-import pandas as pd
 from pathlib import Path
 import requests
 import io
@@ -315,15 +314,30 @@ except KeyError as e:
     st.stop()
 
 # LangChain components
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, WebBaseLoader
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import ConfigurableField
 from langchain.chains import create_retrieval_chain
 from langchain_groq import ChatGroq
-from langchain.schema import Document
+
+from build_index import build_knowledge_base, create_chunker, knowledge_base_manifest, publish_knowledge_base
+from bulk_embedding import BulkEmbedder, create_embeddings
+from answer_cache import SemanticAnswerCache
+from answer_streaming import invoke_streaming
+from context_packer import ContextPacker, PackedRetriever, context_tokens
+from query_embeddings import CachedQueryEmbeddings
+from index_refresh import IndexRefresher, LiveIndex
+from knowledge_index import current_version, load_index, read_manifest
+from knowledge_loaders import FARMER_URLS, load_knowledge_base_documents
+from llm_cache import SQLiteResponseCache
+from model_router import ModelChoice, ModelRouter, STRONG_MODEL
+from partitions import RegionDetector
+from soil_knowledge import load_soil_table
+from speech_pipeline import SpeechPipeline, joined_translation
+from web_snapshots import WebSnapshotStore
+
+logger = logging.getLogger(__name__)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -404,13 +418,144 @@ for path in POSSIBLE_CROP_CYCLE_PATHS:
         CROP_CYCLE_KB_PATH = path
         break
 
-# Original farming URLs for schemes and general info
-FARMER_URLS = [
-    "https://vikaspedia.in/agriculture/crop-production",
-    "https://vikaspedia.in/agriculture/schemes-for-farmers",
-    "https://vikaspedia.in/agriculture/agri-credit",
-    "https://www.india.gov.in/topics/agriculture"
-]
+# Saved FAISS index directory, reused across restarts while its manifest matches
+KB_INDEX_DIR = os.environ.get(
+    "KB_INDEX_DIR",
+    st.secrets.get("settings", {}).get("KB_INDEX_DIR", str(Path(__file__).parent / "kb_index"))
+)
+
+# Only load bundles published by build_index.py, never build inside the app
+KB_OFFLINE_INDEX = str(os.environ.get(
+    "KB_OFFLINE_INDEX",
+    st.secrets.get("settings", {}).get("KB_OFFLINE_INDEX", "false")
+)).lower() in ("1", "true", "yes")
+
+# Embedding backend: "huggingface" (sentence-transformers/torch) or "onnx" (ONNX Runtime, no torch)
+EMBEDDING_BACKEND = os.environ.get(
+    "EMBEDDING_BACKEND",
+    st.secrets.get("settings", {}).get("EMBEDDING_BACKEND", "huggingface")
+).lower()
+ONNX_INTRA_OP_THREADS = int(os.environ.get(
+    "ONNX_INTRA_OP_THREADS",
+    st.secrets.get("settings", {}).get("ONNX_INTRA_OP_THREADS", 0)
+))
+
+# Query embeddings kept per process (LRU), so repeated questions skip model inference
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get(
+    "QUERY_EMBEDDING_CACHE_SIZE",
+    st.secrets.get("settings", {}).get("QUERY_EMBEDDING_CACHE_SIZE", 1024)
+))
+
+# Answers to near-identical English questions (cosine >= ANSWER_CACHE_THRESHOLD) are reused
+# across sessions for ANSWER_CACHE_TTL seconds, per LLM and knowledge base version
+ANSWER_CACHE_SIZE = int(os.environ.get(
+    "ANSWER_CACHE_SIZE",
+    st.secrets.get("settings", {}).get("ANSWER_CACHE_SIZE", 512)
+))
+ANSWER_CACHE_TTL = float(os.environ.get(
+    "ANSWER_CACHE_TTL",
+    st.secrets.get("settings", {}).get("ANSWER_CACHE_TTL", 24 * 3600)
+))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get(
+    "ANSWER_CACHE_THRESHOLD",
+    st.secrets.get("settings", {}).get("ANSWER_CACHE_THRESHOLD", 0.95)
+))
+
+# Worker processes for inline index builds (0 = one per CPU core). The app embeds in
+# process by default: a pool per Streamlit server would fight the sessions for CPU and
+# load a model copy per worker. Bulk builds belong to build_index.py, which uses the pool.
+EMBEDDING_WORKERS = int(os.environ.get(
+    "EMBEDDING_WORKERS",
+    st.secrets.get("settings", {}).get("EMBEDDING_WORKERS", 1)
+))
+
+# Vector index backend: kind "flat" | "hnsw" | "ivfpq", storage "float32" | "float16" | "int8"
+KB_INDEX_SETTINGS = {
+    "kind": os.environ.get("KB_INDEX_KIND", st.secrets.get("settings", {}).get("KB_INDEX_KIND", "flat")).lower(),
+    "storage": os.environ.get("KB_INDEX_STORAGE", st.secrets.get("settings", {}).get("KB_INDEX_STORAGE", "float32")).lower()
+}
+
+# Seconds between background checks for a newer/stale index (0 disables hot-swapping)
+KB_REFRESH_INTERVAL = float(os.environ.get(
+    "KB_REFRESH_INTERVAL",
+    st.secrets.get("settings", {}).get("KB_REFRESH_INTERVAL", 300)
+))
+
+# Serve the saved index memory-mapped so worker processes share one copy of the vectors
+KB_INDEX_MMAP = str(os.environ.get(
+    "KB_INDEX_MMAP",
+    st.secrets.get("settings", {}).get("KB_INDEX_MMAP", "true")
+)).lower() in ("1", "true", "yes")
+
+# Retrieval: "hierarchical" (crop guide sections first, then hybrid search within them),
+# "hybrid" (BM25 + dense, reciprocal-rank fusion) or "similarity" (dense only)
+KB_RETRIEVAL_MODE = os.environ.get(
+    "KB_RETRIEVAL_MODE",
+    st.secrets.get("settings", {}).get("KB_RETRIEVAL_MODE", "hierarchical")
+).lower()
+
+# The 4 prompt chunks are picked from KB_FETCH_K candidates by maximal marginal relevance
+# (KB_MMR_LAMBDA = weight of relevance vs. diversity, 1 disables diversity)
+KB_FETCH_K = int(os.environ.get(
+    "KB_FETCH_K",
+    st.secrets.get("settings", {}).get("KB_FETCH_K", 40)
+))
+KB_MMR_LAMBDA = float(os.environ.get(
+    "KB_MMR_LAMBDA",
+    st.secrets.get("settings", {}).get("KB_MMR_LAMBDA", 0.7)
+))
+
+# Chunks less similar to the question than this (cosine) are left out of the prompt; 0 disables
+KB_SCORE_THRESHOLD = float(os.environ.get(
+    "KB_SCORE_THRESHOLD",
+    st.secrets.get("settings", {}).get("KB_SCORE_THRESHOLD", 0)
+))
+
+# Retrieved chunks are merged and packed into at most KB_CONTEXT_TOKENS prompt tokens (tiktoken)
+KB_RETRIEVAL_K = int(os.environ.get(
+    "KB_RETRIEVAL_K",
+    st.secrets.get("settings", {}).get("KB_RETRIEVAL_K", 8)
+))
+KB_CONTEXT_TOKENS = int(os.environ.get(
+    "KB_CONTEXT_TOKENS",
+    st.secrets.get("settings", {}).get("KB_CONTEXT_TOKENS", 1200)
+))
+
+# Content-addressed chunk embeddings, so knowledge base edits only re-embed changed chunks
+KB_EMBEDDING_CACHE_DIR = os.environ.get(
+    "KB_EMBEDDING_CACHE_DIR",
+    st.secrets.get("settings", {}).get("KB_EMBEDDING_CACHE_DIR", str(Path(KB_INDEX_DIR).parent / "kb_embedding_cache"))
+)
+
+# Persistent exact-match cache of LLM responses (per model and rendered prompt), evicted beyond LLM_CACHE_MAX_MB
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    st.secrets.get("settings", {}).get("LLM_CACHE_PATH", str(Path(KB_INDEX_DIR).parent / "llm_cache" / "responses.sqlite"))
+)
+LLM_CACHE_MAX_MB = float(os.environ.get(
+    "LLM_CACHE_MAX_MB",
+    st.secrets.get("settings", {}).get("LLM_CACHE_MAX_MB", 64)
+))
+
+# With "Auto" model selection each question is routed to the Groq model expected to answer it
+# well within this many seconds
+MODEL_LATENCY_BUDGET = float(os.environ.get(
+    "MODEL_LATENCY_BUDGET",
+    st.secrets.get("settings", {}).get("MODEL_LATENCY_BUDGET", 8.0)
+))
+AUTO_MODEL = "auto"
+
+# Farmer scheme pages are served from on-disk snapshots, revalidated in the background
+WEB_SNAPSHOT_DIR = os.environ.get(
+    "WEB_SNAPSHOT_DIR",
+    st.secrets.get("settings", {}).get("WEB_SNAPSHOT_DIR", str(Path(KB_INDEX_DIR).parent / "kb_web_snapshots"))
+)
+
+# Seconds a page snapshot is served before it is conditionally re-fetched
+WEB_SNAPSHOT_MAX_AGE = float(os.environ.get(
+    "WEB_SNAPSHOT_MAX_AGE",
+    st.secrets.get("settings", {}).get("WEB_SNAPSHOT_MAX_AGE", 3600)
+))
 
 class SarvamVoiceProcessor:
     """Complete Sarvam API implementation with robust audio processing and fixed language handling"""
@@ -1493,183 +1638,6 @@ class SarvamVoiceProcessor:
 
         return valid_chunks if valid_chunks else [text[:max_chunk_size]]
 
-class SoilKnowledgeLoader:
-    """Custom loader for soil knowledge base files"""
-
-    def __init__(self, kb_path: str):
-        self.kb_path = Path(kb_path)
-
-    def load_all_documents(self):
-        """Load all documents from the soil knowledge base"""
-        documents = []
-
-        # 1. Load JSON knowledge base
-        json_file = self.kb_path / "complete_soil_knowledge_base.json"
-        if json_file.exists():
-            documents.extend(self._load_json_kb(json_file))
-            st.sidebar.success("✅ JSON soil database loaded")
-
-        # 2. Load text documents with error handling
-        docs_folder = self.kb_path / "documents"
-        if docs_folder.exists():
-            documents.extend(self._load_text_documents_safely(docs_folder))
-            st.sidebar.success("✅ Text documents loaded")
-
-        # 3. Load CSV data as documents
-        csv_files = ["city_soil_profiles.csv", "regional_soil_statistics.csv"]
-        csv_loaded = 0
-        for csv_file in csv_files:
-            csv_path = self.kb_path / csv_file
-            if csv_path.exists():
-                documents.extend(self._load_csv_data(csv_path))
-                csv_loaded += 1
-
-        if csv_loaded > 0:
-            st.sidebar.success(f"✅ {csv_loaded} CSV files loaded")
-
-        return documents
-
-    def _load_text_documents_safely(self, docs_folder: Path):
-        """Load text documents with enhanced error handling"""
-        documents = []
-
-        try:
-            txt_files = list(docs_folder.glob("*.txt"))
-
-            for txt_file in txt_files:
-                try:
-                    encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
-
-                    content = None
-                    for encoding in encodings:
-                        try:
-                            with open(txt_file, 'r', encoding=encoding) as f:
-                                content = f.read()
-                            break
-                        except UnicodeDecodeError:
-                            continue
-
-                    if content:
-                        filename = txt_file.stem
-                        doc = Document(
-                            page_content=content,
-                            metadata={
-                                "source": str(txt_file),
-                                "type": "comprehensive_analysis",
-                                "category": "soil_report",
-                                "filename": filename
-                            }
-                        )
-
-                        # Add state/region info based on filename
-                        filename_lower = filename.lower()
-                        if "tamil_nadu" in filename_lower or "chennai" in filename_lower:
-                            doc.metadata["region"] = "tamil_nadu"
-                            doc.metadata["state"] = "Tamil Nadu"
-                        elif "kerala" in filename_lower or "kochi" in filename_lower:
-                            doc.metadata["region"] = "kerala"
-                            doc.metadata["state"] = "Kerala"
-
-                        documents.append(doc)
-                    else:
-                        st.sidebar.warning(f"⚠️ Could not read {txt_file.name}")
-
-                except Exception as e:
-                    st.sidebar.warning(f"⚠️ Error loading {txt_file.name}: {str(e)}")
-                    continue
-
-        except Exception as e:
-            st.sidebar.error(f"Error accessing documents folder: {e}")
-
-        return documents
-
-    def _load_json_kb(self, json_file: Path):
-        """Load and convert JSON knowledge base to documents"""
-        documents = []
-
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                kb_data = json.load(f)
-
-            # Create comprehensive documents from different sections
-            # [Previous JSON loading logic remains the same - keeping it for brevity]
-            # ... (implement the same JSON processing as in original)
-
-        except Exception as e:
-            st.error(f"Error loading JSON knowledge base: {e}")
-
-        return documents
-
-    def _load_csv_data(self, csv_file: Path):
-        """Convert CSV data to documents"""
-        documents = []
-
-        try:
-            df = pd.read_csv(csv_file)
-
-            if "city_soil_profiles" in csv_file.name:
-                for _, row in df.iterrows():
-                    content = f"""
-COMPREHENSIVE CITY SOIL PROFILE: {row.get('city', 'N/A')}, {row.get('region', 'N/A')}
-Geographic Location: {row.get('latitude', 'N/A')}°N, {row.get('longitude', 'N/A')}°E
-
-MEASURED SOIL PARAMETERS:
-"""
-                    # Add soil parameters
-                    for col in df.columns:
-                        if col.endswith('_value'):
-                            param = col.replace('_value', '')
-                            value = row.get(col, 'N/A')
-                            content += f"• {param.upper().replace('_', ' ')}: {value}\n"
-
-                    documents.append(Document(
-                        page_content=content,
-                        metadata={
-                            "source": f"csv_city_{row.get('city', 'unknown')}",
-                            "type": "detailed_city_data",
-                            "category": "city_soil_data"
-                        }
-                    ))
-
-        except Exception as e:
-            st.error(f"Error loading CSV file {csv_file}: {e}")
-
-        return documents
-
-
-class CropCycleKnowledgeLoader:
-    """Custom loader for crop cycle knowledge base"""
-
-    def __init__(self, kb_path: str):
-        self.kb_path = Path(kb_path)
-
-    def load_all_documents(self):
-        """Load all crop cycle documents"""
-        documents = []
-
-        json_file = self.kb_path / "crop_cycle.json"
-        if json_file.exists():
-            documents.extend(self._load_crop_cycle_json(json_file))
-            st.sidebar.success("✅ Crop cycle database loaded")
-
-        return documents
-
-    def _load_crop_cycle_json(self, json_file: Path):
-        """Load and convert crop cycle JSON to documents"""
-        documents = []
-
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                crop_data = json.load(f)
-
-            # [Previous crop cycle JSON processing logic - keeping for brevity]
-            # ... (implement the same processing as in original)
-
-        except Exception as e:
-            st.error(f"Error loading crop cycle JSON: {e}")
-
-        return documents
-
 def handle_text_input_with_native_response(user_prompt, prompt, sarvam_processor, retrieval_chain):
     """MODIFIED: Handle text input with native language response"""
     
@@ -1691,7 +1659,7 @@ def handle_text_input_with_native_response(user_prompt, prompt, sarvam_processor
         else:
             # Fallback to English-only processing
             start_time = time.time()
-            response = retrieval_chain.invoke({"input": question_to_process})
+            response = stream_answer(retrieval_chain, question_to_process)
             end_time = time.time()
             response_time = round(end_time - start_time, 2)
             
@@ -1703,6 +1671,7 @@ def handle_text_input_with_native_response(user_prompt, prompt, sarvam_processor
             
             # Context display
             with st.expander("📚 Retrieved Knowledge Sources"):
+                st.caption(f"🧮 {context_tokens(response['context'])}/{KB_CONTEXT_TOKENS} context tokens")
                 for i, doc in enumerate(response['context'], 1):
                     source_name = doc.metadata.get('source', f'Source {i}')
                     st.markdown(f"*{i}. {source_name}*")
@@ -1735,25 +1704,21 @@ def handle_uploaded_audio_with_native_response(sarvam_processor, retrieval_chain
                     'english'
                 )
         
-        # Get AI response
+        # Get AI response; finished sentences are translated and voiced while the rest is generated
+        pipeline = start_speech_pipeline(current_language, st.session_state.voice_processor)  # Use current_language
+        player = st.empty()
         with st.spinner("🧠 Generating response..."):
             start_time = time.time()
-            response = retrieval_chain.invoke({"input": english_text})
+            response = stream_answer(retrieval_chain, english_text, on_text=speak_as_streamed(pipeline, player))
             response_time = round(time.time() - start_time, 2)
             answer = response['answer']
         
         # ALWAYS translate back to native language
-        final_answer = answer
-        if current_language != 'english':  # Use current_language instead of upload_language
-            with st.spinner(f"🔄 Translating to {current_language}..."):
-                final_answer, _ = st.session_state.voice_processor.translate_text(
-                answer, 'english', current_language  # Use current_language
-            )
-        
-        with st.spinner(f"🔊 Generating complete audio..."):
-            audio_bytes, tts_success = st.session_state.voice_processor.text_to_speech(
-            final_answer, current_language  # Use current_language
-        )
+        with st.spinner(f"🔊 Translating to {current_language} and generating complete audio..."):
+            final_answer, audio_bytes, _ = finish_speech(pipeline, answer, st.session_state.voice_processor, player)
+        if current_language == 'english':
+            final_answer = answer
+        tts_success = audio_bytes is not None
         
         # Display results - NATIVE LANGUAGE FIRST
         st.markdown(f"**🗣️ Transcribed ({upload_result['language']}):** {upload_result['original_transcript']}")
@@ -1783,6 +1748,171 @@ def handle_uploaded_audio_with_native_response(sarvam_processor, retrieval_chain
         # Stop auto-scrolling
         stop_autoscroll()
 
+def choose_model(question: str) -> ModelChoice:
+    """The Groq model for an English question: the sidebar choice, or the router's pick under Auto"""
+    if selected_model != AUTO_MODEL:
+        logger.info("Model: %s (selected in the sidebar)", selected_model)
+        return ModelChoice(selected_model, "selected in the sidebar")
+    return get_model_router(st.session_state.get("soil_table")).route(question)
+
+
+def stream_answer(retrieval_chain, question: str, on_text=None, choice: ModelChoice = None) -> dict:
+    """Run the RAG chain on question, rendering the answer as its tokens stream in.
+
+    The partial answer is cleared once the response is complete, so callers
+    render the final answer (or its translation) as before. on_text, if
+    given, also receives the answer so far. The model is choose_model's
+    unless a choice is passed.
+    """
+    choice = choice or choose_model(question)
+    st.caption(f"🤖 {choice.model} - {choice.reason}")
+    placeholder = st.empty()
+    streamed = []
+
+    def render(text):
+        streamed.append(True)
+        placeholder.markdown(text + " ▌")
+        if on_text is not None:
+            on_text(text)
+
+    start_time = time.time()
+    try:
+        response = invoke_streaming(
+            retrieval_chain, {"input": question}, render, config={"configurable": {"model_name": choice.model}}
+        )
+    finally:
+        placeholder.empty()
+    if streamed:
+        # Cached responses arrive without tokens and say nothing about the model's latency
+        get_model_router(st.session_state.get("soil_table")).record(choice.model, time.time() - start_time)
+    return response
+
+
+def start_speech_pipeline(language: str, sarvam_processor: SarvamVoiceProcessor, translate: bool = True) -> SpeechPipeline:
+    """Pipeline that translates English answer segments into language (unless translate is False) and voices them"""
+    def translate_segment(text):
+        if not translate or not language or language.lower() == 'english':
+            return text, True
+        return sarvam_processor.translate_text(text, 'english', language)
+
+    return SpeechPipeline(translate_segment, lambda text: sarvam_processor.text_to_speech(text, language))
+
+
+def play_first_audio(pipeline: SpeechPipeline, player):
+    """Start playing the first voiced segment as soon as it is ready"""
+    audio = pipeline.take_first_audio()
+    if player is not None and audio:
+        with player.container():
+            st.caption("🔊 Start of the answer - the complete audio follows below")
+            st.audio(audio, format='audio/wav', autoplay=True)
+
+
+def speak_as_streamed(pipeline: SpeechPipeline, player):
+    """on_text callback feeding the streaming answer to the speech pipeline"""
+    def on_text(text):
+        pipeline.feed(text)
+        play_first_audio(pipeline, player)
+    return on_text
+
+
+def finish_speech(pipeline: SpeechPipeline, answer: str, sarvam_processor: SarvamVoiceProcessor, player=None) -> tuple:
+    """Wait for the pipeline to translate and voice the complete answer.
+
+    Returns (translated answer, audio bytes or None, whether every segment was translated).
+    """
+    segments, clips = [], []
+    for segment in pipeline.finish(answer):
+        segments.append(segment)
+        if segment.audio:
+            clips.append(segment.audio)
+        play_first_audio(pipeline, player)
+    audio = sarvam_processor._fast_concatenate_audio(clips) if clips else None
+    return joined_translation(segments), audio, all(segment.translated_ok for segment in segments)
+
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    """Process-wide semantic answer cache shared by all sessions"""
+    return SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+
+
+def answer_namespace(question: str) -> str:
+    """Answer cache namespace of an English question.
+
+    Paraphrases only share an answer when they search the same knowledge base
+    version with the same region filter and name the same regions, soil
+    parameters and crops - "pH in Kerala" and "pH in Punjab" embed closely but
+    retrieve different context. A model picked in the sidebar is part of the
+    key, so its answers are never served from another model; under Auto the
+    routed models share answers.
+    """
+    router = get_model_router(st.session_state.get("soil_table"))
+    features = router.features(question)
+    region_filter = router.regions(question) if router.regions is not None else None
+    return "|".join([
+        selected_model,
+        str(st.session_state.vectors.version),
+        ",".join(region_filter["region"]) if region_filter else "",
+        ",".join(features.regions),
+        ",".join(features.parameters),
+        ",".join(features.crops)
+    ])
+
+
+def answer_english_query(english_text: str, retrieval_chain, on_text=None) -> tuple:
+    """Answer an English question, reusing the cached answer of a near-identical one.
+
+    Returns (entry, from_cache). The query embedding comes from the query
+    embedding cache, so retrieval on a miss does not embed it again. on_text
+    receives the streaming answer on a miss.
+    """
+    answer_cache = get_answer_cache()
+    vector = st.session_state.embeddings.embed_query(english_text)
+    namespace = answer_namespace(english_text)
+    entry = answer_cache.lookup(vector, namespace)
+    if entry is not None:
+        return entry, True
+
+    response = stream_answer(retrieval_chain, english_text, on_text)
+    return answer_cache.store(vector, namespace, english_text, response['answer'], response['context']), False
+
+
+def translate_cached_answer(entry, language: str, sarvam_processor: SarvamVoiceProcessor) -> str:
+    """The answer of a cache entry in language, translating (and remembering) it on first use"""
+    if not language or language.lower() == 'english':
+        return entry.answer
+    if language in entry.translations:
+        return entry.translations[language]
+
+    translated, translate_ok = sarvam_processor.translate_text(entry.answer, 'english', language)
+    if not translate_ok or not translated.strip():
+        return entry.answer  # Fallback to English, not cached
+    entry.translations[language] = translated
+    return translated
+
+
+def voice_cached_answer(entry, from_cache: bool, language: str, sarvam_processor: SarvamVoiceProcessor,
+                        pipeline: SpeechPipeline, player=None) -> tuple:
+    """The answer of a cache entry in language and its audio, as (answer, audio bytes or None).
+
+    pipeline is the one the answer was streamed into; a cached answer that
+    was translated before is only voiced.
+    """
+    english = not language or language.lower() == 'english'
+    known = entry.answer if english else entry.translations.get(language)
+    if from_cache and known is not None:
+        pipeline = start_speech_pipeline(language, sarvam_processor, translate=False)
+        _, audio, _ = finish_speech(pipeline, known, sarvam_processor, player)
+        return known, audio
+
+    translated, audio, translate_ok = finish_speech(pipeline, entry.answer, sarvam_processor, player)
+    if english:
+        return entry.answer, audio
+    if translate_ok:
+        entry.translations[language] = translated
+    return translated, audio
+
+
 def process_voice_query_with_selected_language(
     audio_bytes: bytes,
     sarvam_processor: SarvamVoiceProcessor,
@@ -1818,21 +1948,21 @@ def process_voice_query_with_selected_language(
             if translate_ok and translated_text.strip():
                 english_text = translated_text
 
-        # Step 3: Query RAG system (always in English)
+        # Step 3: Query RAG system (always in English), or reuse the answer to the same question.
+        # Each finished sentence is translated and voiced while the next ones are generated.
+        pipeline = start_speech_pipeline(detected_lang, sarvam_processor)
+        player = st.empty()
         with st.spinner("🧠 Generating response..."):
-            start_time = time.time()
-            response = retrieval_chain.invoke({"input": english_text})
-            response_time = round(time.time() - start_time, 2)
-            answer = response.get("answer", "")
+            entry, from_cache = answer_english_query(
+                english_text, retrieval_chain, on_text=speak_as_streamed(pipeline, player)
+            )
+            answer = entry.answer
 
-        # Step 4: Translate AI answer back into detected language (ALWAYS!)
-        final_answer = answer
-        if detected_lang and detected_lang.lower() != "english":
-            translated_back, translate_back_ok = sarvam_processor.translate_text(
-                answer, "english", detected_lang
+        # Step 4: Translate AI answer back into detected language (ALWAYS!) and voice it
+        with st.spinner("🔊 Translating and voicing the answer..."):
+            final_answer, audio_response = voice_cached_answer(
+                entry, from_cache, detected_lang, sarvam_processor, pipeline, player
             )
-            if translate_back_ok and translated_back.strip():
-                final_answer = translated_back
 
         return {
             "success": True,
@@ -1842,6 +1972,9 @@ def process_voice_query_with_selected_language(
             "english_text": english_text,   # Used internally
             "answer": answer,               # English version
             "final_answer": final_answer,   # Same language as input
+            "audio_response": audio_response,
+            "context": entry.context,
+            "from_cache": from_cache,
             "response_time": round(time.time() - total_start_time, 2)
         }
 
@@ -1881,8 +2014,21 @@ def display_voice_response(voice_result: dict):
         with st.expander("📖 View English Version"):
             st.markdown(english_answer)
 
+    audio_response = voice_result.get("audio_response")
+    if audio_response:
+        st.markdown("### 🔊 Complete Audio Response:")
+        st.audio(audio_response, format='audio/wav')
+        st.download_button(
+            label="📥 Download Complete Audio",
+            data=audio_response,
+            file_name=f"response_{detected_lang}.wav",
+            mime="audio/wav"
+        )
+
     # Meta info
     st.info(f"🌍 Answered in your input language: {detected_lang}")
+    if voice_result.get("from_cache"):
+        st.caption(f"⚡ Answered from cache in {voice_result.get('response_time')} seconds")
 
 
 def process_text_query_with_language_detection(user_input: str, sarvam_processor: SarvamVoiceProcessor, retrieval_chain) -> dict:
@@ -1902,18 +2048,16 @@ def process_text_query_with_language_detection(user_input: str, sarvam_processor
                 if not translate_success:
                     english_text = user_input  # Fallback to original
         
-        # Get response from RAG system
+        # Get response from RAG system, or the cached answer to the same question
         with st.spinner("🧠 Generating response..."):
-            response = retrieval_chain.invoke({"input": english_text})
-            answer = response['answer']
+            entry, from_cache = answer_english_query(english_text, retrieval_chain)
+            answer = entry.answer
         
         # Translate response back to original language
         final_answer = answer
         if detected_lang != 'english':
             with st.spinner(f"🔄 Translating response to {detected_lang}..."):
-                final_answer, translate_back_success = sarvam_processor.translate_text(answer, 'english', detected_lang)
-                if not translate_back_success:
-                    final_answer = answer  # Fallback to English
+                final_answer = translate_cached_answer(entry, detected_lang, sarvam_processor)
         
         # Generate audio in native language
         audio_response = None
@@ -1933,7 +2077,8 @@ def process_text_query_with_language_detection(user_input: str, sarvam_processor
             'native_answer': final_answer,
             'audio_response': audio_response,
             'response_time': response_time,
-            'context': response['context'],
+            'context': entry.context,
+            'from_cache': from_cache,
             'audio_generation_success': tts_success
         }
         
@@ -2045,6 +2190,7 @@ def display_text_response_with_selected_language(question: str, answer: str, cur
     
     # Context display
     with st.expander("📚 Retrieved Knowledge Sources"):
+        st.caption(f"🧮 {context_tokens(context)}/{KB_CONTEXT_TOKENS} context tokens")
         for i, doc in enumerate(context, 1):
             source_name = doc.metadata.get('source', f'Source {i}')
             st.markdown(f"*{i}. {source_name}*")
@@ -2081,7 +2227,7 @@ def display_text_response_with_native_language(result: dict):
     # Generate Audio button for text responses
     col1, col2 = st.columns([3, 1])
     with col1:
-        st.success(f"⚡ Generated in {result['response_time']} seconds")
+        st.success(f"⚡ {'Answered from cache' if result.get('from_cache') else 'Generated'} in {result['response_time']} seconds")
     
     with col2:
         if st.button("🔊 Generate Audio", key=f"generate_audio_native_{hash(result['original_query'])}", use_container_width=True):
@@ -2099,6 +2245,7 @@ def display_text_response_with_native_language(result: dict):
     
     # Context display
     with st.expander("📚 Retrieved Knowledge Sources"):
+        st.caption(f"🧮 {context_tokens(result['context'])}/{KB_CONTEXT_TOKENS} context tokens")
         for i, doc in enumerate(result['context'], 1):
             source_name = doc.metadata.get('source', f'Source {i}')
             st.markdown(f"*{i}. {source_name}*")
@@ -2271,8 +2418,9 @@ with st.sidebar:
 
     selected_model = st.selectbox(
         "🤖 Select AI Model:",
-        available_models,
-        index=1,  # Default to the more powerful model
+        [AUTO_MODEL] + available_models,
+        index=0,  # Default to routing each question to a model
+        format_func=lambda model: "🧭 Auto (per question)" if model == AUTO_MODEL else model,
         key="ai_model_selection"
     )
     
@@ -2326,74 +2474,135 @@ if "vectors" not in st.session_state:
             print(MODEL_PATH)
             @st.cache_resource(show_spinner="🔨 Loading embeddings...")
             def get_embeddings():
-                return HuggingFaceEmbeddings(
-                    model_name=str(MODEL_PATH),
-                    model_kwargs={'device': 'cpu'},
-                    encode_kwargs={'normalize_embeddings': True}
+                return CachedQueryEmbeddings(
+                    create_embeddings(
+                        EMBEDDING_BACKEND,
+                        MODEL_PATH,
+                        intra_op_threads=ONNX_INTRA_OP_THREADS if EMBEDDING_BACKEND == "onnx" else 0
+                    ),
+                    max_size=QUERY_EMBEDDING_CACHE_SIZE
                 )
            
             # Initialize embeddings
             embeddings=get_embeddings()
             st.session_state.embeddings=get_embeddings()
-            @st.cache_data(show_spinner="📚 Loading documents...", ttl=3600)
-            def load_all_documents():
-                """Cached document loading"""
-                all_documents = []
-                
-                # Load soil knowledge base
-                if SOIL_KB_PATH:
-                    loader = SoilKnowledgeLoader(SOIL_KB_PATH)
-                    soil_documents = loader.load_all_documents()
-                    all_documents.extend(soil_documents)
-                
-                # Load crop cycle knowledge base
-                if CROP_CYCLE_KB_PATH:
-                    crop_loader = CropCycleKnowledgeLoader(CROP_CYCLE_KB_PATH)
-                    crop_documents = crop_loader.load_all_documents()
-                    all_documents.extend(crop_documents)
-                
-                # Load web documents (cache for 1 hour)
-                try:
-                    web_loader = WebBaseLoader(FARMER_URLS)
-                    web_documents = web_loader.load()
-                    for doc in web_documents:
-                        doc.metadata.update({
-                            "category": "farming_schemes",
-                            "type": "government_info",
-                            "data_format": "web"
-                        })
-                    all_documents.extend(web_documents)
-                except Exception as e:
-                    st.sidebar.warning(f"⚠️ Web loading issue: {e}")
-                
-                return all_documents
 
-            all_documents=load_all_documents()
+            @st.cache_resource(show_spinner=False)
+            def get_chunker():
+                return create_chunker(MODEL_PATH)
 
-            # 4. Process all documents
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=800,
-                chunk_overlap=100,
-                separators=["\n\n", "\n", ".", " "]
-            )
-            final_documents = text_splitter.split_documents(all_documents)
+            @st.cache_resource(show_spinner=False)
+            def get_web_snapshots():
+                """Process-wide snapshot store, so only one background refresh runs at a time"""
+                return WebSnapshotStore(WEB_SNAPSHOT_DIR, max_age=WEB_SNAPSHOT_MAX_AGE)
 
-            # 5. Create vector store
+            def load_all_documents():
+                """Load the knowledge base for a build.
+
+                Not cached: the served index reads chunks from its SQLite
+                docstore, so the raw documents are dropped once the build is
+                published instead of staying resident for the process lifetime.
+                """
+                return load_knowledge_base_documents(
+                    SOIL_KB_PATH, CROP_CYCLE_KB_PATH, FARMER_URLS, get_web_snapshots()
+                )
+
+            # 4. Load the published bundle (offline builds), or load/build it here
             @st.cache_resource(show_spinner="🔨 Building vector store...")
-            def create_vector_store(_embeddings, _documents):  # Add underscore to _documents
-                """Cached vector store creation"""
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=800,
-                    chunk_overlap=100,
-                    separators=["\n\n", "\n", ".", " "]
+            def create_vector_store(_embeddings, offline_only):
+                """Cached vector store creation, reusing the saved index while its manifest matches"""
+                if offline_only:
+                    vectors = load_index(KB_INDEX_DIR, _embeddings, mmap=KB_INDEX_MMAP)
+                    if vectors is None:
+                        raise RuntimeError(f"No published index bundle in {KB_INDEX_DIR} - run build_index.py")
+                    return vectors, vectors.index.ntotal
+
+                kb_manifest = knowledge_base_manifest(
+                    SOIL_KB_PATH, CROP_CYCLE_KB_PATH, MODEL_PATH, FARMER_URLS, KB_INDEX_SETTINGS, WEB_SNAPSHOT_DIR
                 )
-                final_documents = text_splitter.split_documents(_documents)
-                
-                return FAISS.from_documents(final_documents, _embeddings), len(final_documents)
+                vectors = load_index(KB_INDEX_DIR, _embeddings, kb_manifest, mmap=KB_INDEX_MMAP)
+                if vectors is not None:
+                    return vectors, vectors.index.ntotal
+
+                embedder = BulkEmbedder(
+                    embeddings=_embeddings,
+                    backend=EMBEDDING_BACKEND,
+                    model_path=MODEL_PATH,
+                    workers=EMBEDDING_WORKERS
+                )
+                vectors, sync_stats, embedding_store = build_knowledge_base(
+                    load_all_documents(), _embeddings, kb_manifest, KB_INDEX_DIR, KB_EMBEDDING_CACHE_DIR,
+                    get_chunker(), embedder
+                )
+                throughput = (
+                    f" ({sync_stats['chunks_per_sec']} chunks/sec on {sync_stats['workers']} worker(s))"
+                    if sync_stats['chunks_per_sec'] else ""
+                )
+                st.sidebar.info(
+                    f"🧮 Embedded {sync_stats['embedded']} new chunks{throughput}, "
+                    f"reused {sync_stats['chunks'] - sync_stats['embedded']}, "
+                    f"removed {sync_stats['removed']}"
+                )
+                index_stats = sync_stats['index']
+                if index_stats and index_stats['description'] != "Flat":
+                    st.sidebar.info(
+                        f"🗂️ Index {index_stats['description']}: recall@4 {index_stats['recall_at_k']:.1%}, "
+                        f"{index_stats['index_bytes'] / 1e6:.1f} MB vs {index_stats['exact_bytes'] / 1e6:.1f} MB exact"
+                    )
+
+                try:
+                    publish_knowledge_base(vectors, sync_stats, embedding_store, kb_manifest, KB_INDEX_DIR)
+                    # Serve the freshly written files like every other process does
+                    vectors = load_index(KB_INDEX_DIR, _embeddings, kb_manifest, mmap=KB_INDEX_MMAP) or vectors
+                except Exception as e:
+                    st.sidebar.warning(f"⚠️ Could not save knowledge base index: {e}")
+
+                return vectors, vectors.index.ntotal
             
-            st.session_state.vectors,chunk_count = create_vector_store(st.session_state.embeddings,all_documents)
+            def rebuild_if_stale(embeddings):
+                """Build and publish a new bundle next to the live one if the knowledge base changed"""
+                # Pages changed by this revalidation are picked up on the next check
+                get_web_snapshots().revalidate_in_background(FARMER_URLS)
+                kb_manifest = knowledge_base_manifest(
+                    SOIL_KB_PATH, CROP_CYCLE_KB_PATH, MODEL_PATH, FARMER_URLS, KB_INDEX_SETTINGS, WEB_SNAPSHOT_DIR
+                )
+                stored = read_manifest(current_version(KB_INDEX_DIR))
+                if stored and stored.get("digest") == kb_manifest["digest"]:
+                    return False
 
-            st.sidebar.success(f"✅ Knowledge Base Ready! ({len(final_documents)} chunks)")
+                vectors, sync_stats, embedding_store = build_knowledge_base(
+                    load_all_documents(), embeddings, kb_manifest, KB_INDEX_DIR, KB_EMBEDDING_CACHE_DIR,
+                    get_chunker(), BulkEmbedder(embeddings=embeddings)
+                )
+                publish_knowledge_base(vectors, sync_stats, embedding_store, kb_manifest, KB_INDEX_DIR)
+                return True
+
+            # 5. Serve through a process-wide live index that a background refresher can hot-swap
+            @st.cache_resource(show_spinner=False)
+            def get_live_index(_embeddings, offline_only):
+                vectors, _ = create_vector_store(_embeddings, offline_only)
+                version_dir = current_version(KB_INDEX_DIR)
+                live_index = LiveIndex(vectors, version_dir.name if version_dir else None)
+                IndexRefresher(
+                    live_index,
+                    KB_INDEX_DIR,
+                    load_fn=lambda: load_index(KB_INDEX_DIR, _embeddings, mmap=KB_INDEX_MMAP),
+                    rebuild_fn=None if offline_only else lambda: rebuild_if_stale(_embeddings),
+                    interval=KB_REFRESH_INTERVAL
+                ).start()
+                return live_index
+
+            st.session_state.vectors = get_live_index(st.session_state.embeddings, KB_OFFLINE_INDEX)
+            chunk_count = st.session_state.vectors.ntotal
+
+            st.sidebar.success(f"✅ Knowledge Base Ready! ({chunk_count} chunks)")
+
+            # 6. Typed soil statistics for direct (region, parameter, depth) lookups
+            @st.cache_resource(show_spinner=False)
+            def get_soil_table():
+                return load_soil_table(SOIL_KB_PATH)
+
+            st.session_state.soil_table = get_soil_table()
 
         except Exception as e:
             st.error(f"❌ Failed to build knowledge base: {e}")
@@ -2404,26 +2613,16 @@ def process_query_with_selected_language(query_text: str, sarvam_processor: Sarv
     try:
         start_time = time.time()
         
-        # Get response from RAG system (always in English)
-        response = retrieval_chain.invoke({"input": query_text})
+        # Get response from RAG system (always in English), translating and voicing it sentence by sentence
+        pipeline = start_speech_pipeline(selected_language, sarvam_processor)
+        response = stream_answer(retrieval_chain, query_text, on_text=pipeline.feed)
         answer = response['answer']
         
-        # Translate to selected language if needed
-        final_answer = answer
-        if selected_language != 'english':
-            final_answer, translate_success = sarvam_processor.translate_text(
-                answer, 'english', selected_language
-            )
-            if not translate_success:
-                final_answer = answer  # Fallback
-        
-        # Generate audio in selected language
-        audio_response = None
-        tts_success = False
-        if sarvam_processor:
-            audio_response, tts_success = sarvam_processor.text_to_speech(
-                final_answer, selected_language
-            )
+        # Translate to selected language if needed, and generate audio in selected language
+        final_answer, audio_response, translate_success = finish_speech(pipeline, answer, sarvam_processor)
+        if selected_language == 'english' or not translate_success:
+            final_answer = answer  # Fallback
+        tts_success = audio_response is not None
         
         response_time = round(time.time() - start_time, 2)
         
@@ -2441,14 +2640,32 @@ def process_query_with_selected_language(query_text: str, sarvam_processor: Sarv
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
+
+@st.cache_resource(show_spinner=False)
+def get_llm_cache():
+    """Process-wide handle on the shared LLM response cache file"""
+    return SQLiteResponseCache(LLM_CACHE_PATH, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024))
+
+@st.cache_resource(show_spinner=False)
+def get_model_router(_soil_table):
+    """Process-wide model router, so observed model latencies are shared by all sessions"""
+    return ModelRouter(_soil_table, MODEL_LATENCY_BUDGET)
+
+@st.cache_resource(show_spinner=False)
+def get_context_packer():
+    """Process-wide packer, so the tiktoken encoding is loaded once"""
+    return ContextPacker(KB_CONTEXT_TOKENS)
+
 # --- Enhanced RAG Chain Setup ---
 if "vectors" in st.session_state:
     try:
         # Initialize LLM
         llm = ChatGroq(
             groq_api_key=groq_api_key,
-            model_name=selected_model
-        )
+            model_name=STRONG_MODEL if selected_model == AUTO_MODEL else selected_model,
+            streaming=True,
+            cache=get_llm_cache()
+        ).configurable_fields(model_name=ConfigurableField(id="model_name"))  # Chosen per request, see choose_model
 
         # --- NEW, MORE ROBUST PROMPT TEMPLATE ---
         prompt_template = ChatPromptTemplate.from_template("""
@@ -2529,10 +2746,17 @@ You are a world-class agricultural expert. Your knowledge covers:
 
         # Create enhanced retrieval chain
         document_chain = create_stuff_documents_chain(llm, prompt_template)
+        # Questions naming one state or city only search that region's chunks
+        soil_table = st.session_state.get("soil_table")
+        search_kwargs = {"k": KB_RETRIEVAL_K, "fetch_k": KB_FETCH_K, "lambda_mult": KB_MMR_LAMBDA}
+        if KB_SCORE_THRESHOLD > 0:
+            search_kwargs["score_threshold"] = KB_SCORE_THRESHOLD
         retriever = st.session_state.vectors.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 4}
+            search_type=KB_RETRIEVAL_MODE,
+            search_kwargs=search_kwargs,
+            query_filter=RegionDetector(soil_table.regions) if soil_table else None
         )
+        retriever = PackedRetriever(retriever=retriever, packer=get_context_packer())
         retrieval_chain = create_retrieval_chain(retriever, document_chain)
 
         # Status display
@@ -2543,7 +2767,21 @@ You are a world-class agricultural expert. Your knowledge covers:
             knowledge_sources.append("Crop Cycles")
         knowledge_sources.append("Gov Schemes")
 
-        st.info(f"🤖 **Model:** {selected_model} | 🗄️ **Knowledge:** {' + '.join(knowledge_sources)}")
+        model_label = "auto (per question)" if selected_model == AUTO_MODEL else selected_model
+        st.info(f"🤖 **Model:** {model_label} | 🗄️ **Knowledge:** {' + '.join(knowledge_sources)}")
+        query_cache = st.session_state.embeddings.stats()
+        answer_cache = get_answer_cache().stats()
+        llm_cache = get_llm_cache().stats()
+        routed = get_model_router(soil_table).stats()["routed"]
+        st.sidebar.caption(
+            f"🧠 Query embedding cache: {query_cache['hits']} hits / {query_cache['misses']} misses "
+            f"({query_cache['size']}/{query_cache['max_size']} cached)\n\n"
+            f"💾 Answer cache: {answer_cache['hits']} hits / {answer_cache['misses']} misses "
+            f"({answer_cache['entries']} answers)\n\n"
+            f"🗃️ LLM response cache: {llm_cache['hits']} hits / {llm_cache['misses']} misses "
+            f"({llm_cache['entries']} responses, {llm_cache['bytes'] / 1e6:.1f} MB)\n\n"
+            f"🧭 Routed: " + ", ".join(f"{model} {count}" for model, count in routed.items())
+        )
 
         # --- Sample Questions ---
         st.markdown(f"### {get_text('what_you_can_ask', current_language)}")
@@ -2677,25 +2915,23 @@ You are a world-class agricultural expert. Your knowledge covers:
                         'english'
                     )
 
-            # Get AI response
+            # Get AI response; finished sentences are translated and voiced while the rest is generated
+            pipeline = start_speech_pipeline(upload_audio_result['language'], st.session_state.voice_processor)
+            player = st.empty()
             with st.spinner("🧠 Generating response..."):
                 start_time = time.time()
-                response = retrieval_chain.invoke({"input": english_text})
+                response = stream_answer(retrieval_chain, english_text, on_text=speak_as_streamed(pipeline, player))
                 response_time = round(time.time() - start_time, 2)
                 answer = response['answer']
 
             # Translate back and generate audio
-            final_answer = answer
-            if upload_audio_result['language'] != 'english':
-                with st.spinner(f"🔄 Translating to {upload_audio_result['language']}..."):
-                    final_answer, _ = st.session_state.voice_processor.translate_text(
-                        answer, 'english', upload_audio_result['language']
-                    )
-
-            with st.spinner(f"🔊 Generating complete audio..."):
-                audio_bytes, tts_success = st.session_state.voice_processor.text_to_speech(
-                    final_answer, upload_audio_result['language']
+            with st.spinner(f"🔊 Translating to {upload_audio_result['language']} and generating complete audio..."):
+                final_answer, audio_bytes, _ = finish_speech(
+                    pipeline, answer, st.session_state.voice_processor, player
                 )
+            if upload_audio_result['language'] == 'english':
+                final_answer = answer
+            tts_success = audio_bytes is not None
 
             # Display results
             st.markdown(f"**🗣️ You said:** {upload_audio_result['original_transcript']}")
@@ -2741,7 +2977,7 @@ You are a world-class agricultural expert. Your knowledge covers:
 
             # Get AI response in English first
             start_time = time.time()
-            response = retrieval_chain.invoke({"input": question_to_process})
+            response = stream_answer(retrieval_chain, question_to_process)
             end_time = time.time()
             response_time = round(end_time - start_time, 2)
 
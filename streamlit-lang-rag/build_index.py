@@ -0,0 +1,206 @@
+"""
+Offline knowledge base build.
+
+    python streamlit-lang-rag/build_index.py [--index-dir DIR] [--backend onnx] [--workers 16]
+
+Runs the soil, crop cycle and web loaders, chunks and embeds the documents
+and publishes a new versioned bundle (chunks, vectors, FAISS index and
+manifest) into the index directory. Release pipelines run this once; app
+pods started with KB_OFFLINE_INDEX=true only load the published bundle.
+
+The same pipeline backs the app's inline build when no matching bundle
+exists.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from bulk_embedding import BulkEmbedder, create_embeddings
+from chunk_dedup import dedup_settings, deduplicate_documents
+from hybrid_search import lexical_settings
+from knowledge_index import (
+    ChunkEmbeddingStore, build_manifest, load_index_for_update, save_index, sync_index
+)
+from knowledge_loaders import FARMER_URLS, LOADER_VERSION, load_knowledge_base_documents
+from partitions import PARTITION_FIELDS
+from section_index import section_settings
+from token_chunker import MAX_CHUNK_TOKENS, ChunkCache, TokenChunker
+from web_snapshots import PAGES_DIR, WebSnapshotStore
+
+APP_DIR = Path(__file__).parent
+REPO_DIR = APP_DIR.parent
+
+# Chunking settings, in embedding model tokens (part of the index manifest -
+# changing them triggers a rebuild)
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 32
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+DEFAULT_INDEX_DIR = APP_DIR / "kb_index"
+DEFAULT_EMBEDDING_CACHE_DIR = APP_DIR / "kb_embedding_cache"
+DEFAULT_WEB_SNAPSHOT_DIR = APP_DIR / "kb_web_snapshots"
+DEFAULT_MODEL_PATH = REPO_DIR / "models" / "bge-small-en-v1.5"
+
+
+def knowledge_base_manifest(soil_kb_path, crop_cycle_kb_path, model_path, urls: list, index_settings: dict,
+                            web_snapshot_dir=None) -> dict:
+    """Manifest describing a build from these sources and settings"""
+    return build_manifest(
+        sources={
+            "soil": soil_kb_path,
+            "crop_cycle": str(Path(crop_cycle_kb_path) / "crop_cycle.json") if crop_cycle_kb_path else None,
+            "web": str(Path(web_snapshot_dir) / PAGES_DIR) if urls and web_snapshot_dir else None
+        },
+        splitter_settings=chunker_settings(),
+        model_path=model_path,
+        extra={
+            "farmer_urls": urls,
+            "loader_version": LOADER_VERSION,
+            "dedup": dedup_settings(),
+            "lexical": lexical_settings(),
+            "partitions": list(PARTITION_FIELDS),
+            "sections": section_settings()
+        },
+        index_settings=index_settings
+    )
+
+
+def chunker_settings() -> dict:
+    """Chunking settings; the tokenizer itself is covered by the model fingerprint"""
+    return {
+        "unit": "tokens",
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        "max_tokens": MAX_CHUNK_TOKENS,
+        "separators": CHUNK_SEPARATORS,
+        "strip_whitespace": False,
+        "chunk_metadata": ["chunk_index"]
+    }
+
+
+def create_chunker(model_path) -> TokenChunker:
+    """Chunker measuring chunks with the embedding model's tokenizer"""
+    return TokenChunker(model_path, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_SEPARATORS)
+
+
+def split_documents(documents: list, chunker: TokenChunker, cache_dir) -> tuple:
+    """Split loaded documents into retrieval chunks.
+
+    Unchanged documents reuse their chunks from the previous build in
+    cache_dir. Returns (chunks, stats).
+    """
+    chunk_cache = ChunkCache(cache_dir, chunker_settings())
+    chunks = chunk_cache.split_documents(documents, chunker)
+    chunk_cache.save()
+    return chunks, chunk_cache.last_stats
+
+
+def build_knowledge_base(documents: list, embeddings, manifest: dict, index_dir, embedding_cache_dir,
+                         chunker: TokenChunker, embedder: BulkEmbedder = None) -> tuple:
+    """Chunk, deduplicate and embed documents into a vector store.
+
+    The live bundle is patched when only the knowledge base changed; cached
+    chunk vectors are reused either way. Returns (vectorstore, stats,
+    embedding_store) - pass them to publish_knowledge_base.
+    """
+    start_time = time.time()
+    chunks, split_stats = split_documents(documents, chunker, embedding_cache_dir)
+    final_documents, dedup_stats = deduplicate_documents(chunks)
+
+    embedding_store = ChunkEmbeddingStore(embedding_cache_dir, manifest)
+    previous = load_index_for_update(index_dir, embeddings, manifest)
+    vectors, stats = sync_index(
+        final_documents, embeddings, embedding_store, previous, embedder, manifest["index"]
+    )
+    stats["split"] = split_stats
+    stats["dedup"] = dedup_stats
+    stats["build_seconds"] = round(time.time() - start_time, 2)
+    return vectors, stats, embedding_store
+
+
+def publish_knowledge_base(vectors, stats: dict, embedding_store: ChunkEmbeddingStore, manifest: dict, index_dir) -> str:
+    """Save the embedding cache and publish vectors as the live bundle"""
+    embedding_store.save()
+    return save_index(vectors, index_dir, manifest, store=embedding_store, stats=stats)
+
+
+def _find_path(candidates: list):
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return str(candidate)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and publish the knowledge base index bundle")
+    parser.add_argument("--index-dir", default=os.environ.get("KB_INDEX_DIR", str(DEFAULT_INDEX_DIR)))
+    parser.add_argument("--embedding-cache-dir",
+                        default=os.environ.get("KB_EMBEDDING_CACHE_DIR", str(DEFAULT_EMBEDDING_CACHE_DIR)))
+    parser.add_argument("--soil-kb", default=_find_path([REPO_DIR / "soil_knowledge_base"]))
+    parser.add_argument("--crop-cycle-kb", default=_find_path([REPO_DIR / "cropCycle_knowledge_base"]))
+    parser.add_argument("--model-path", default=os.environ.get("EMBEDDING_MODEL_PATH", str(DEFAULT_MODEL_PATH)))
+    parser.add_argument("--backend", choices=["huggingface", "onnx"],
+                        default=os.environ.get("EMBEDDING_BACKEND", "huggingface").lower())
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("EMBEDDING_WORKERS", 0)),
+                        help="embedding worker processes (0 = one per CPU core)")
+    parser.add_argument("--index-kind", choices=["flat", "hnsw", "ivfpq"],
+                        default=os.environ.get("KB_INDEX_KIND", "flat").lower())
+    parser.add_argument("--index-storage", choices=["float32", "float16", "int8"],
+                        default=os.environ.get("KB_INDEX_STORAGE", "float32").lower())
+    parser.add_argument("--web-snapshot-dir",
+                        default=os.environ.get("WEB_SNAPSHOT_DIR", str(DEFAULT_WEB_SNAPSHOT_DIR)))
+    parser.add_argument("--no-web", action="store_true", help="skip the farmer scheme web pages")
+    args = parser.parse_args(argv)
+    # Loader messages (files read, sources that failed) go to the console
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    urls = [] if args.no_web else FARMER_URLS
+    web_snapshots = WebSnapshotStore(args.web_snapshot_dir)
+    if urls:
+        # Offline builds can wait for the network; pages that fail keep their last snapshot
+        print(f"Refreshing web snapshots in {args.web_snapshot_dir}")
+        for url, status in web_snapshots.refresh(urls).items():
+            print(f"  {status}: {url}")
+
+    index_settings = {"kind": args.index_kind, "storage": args.index_storage}
+    manifest = knowledge_base_manifest(
+        args.soil_kb, args.crop_cycle_kb, args.model_path, urls, index_settings, args.web_snapshot_dir
+    )
+
+    print(f"Loading documents (soil: {args.soil_kb}, crop cycle: {args.crop_cycle_kb}, web pages: {len(urls)})")
+    documents = load_knowledge_base_documents(args.soil_kb, args.crop_cycle_kb, urls, web_snapshots)
+    if not documents:
+        print("No documents loaded - nothing to build", file=sys.stderr)
+        return 1
+
+    embeddings = create_embeddings(args.backend, args.model_path)
+    embedder = BulkEmbedder(embeddings=embeddings, backend=args.backend, model_path=args.model_path, workers=args.workers)
+
+    vectors, stats, embedding_store = build_knowledge_base(
+        documents, embeddings, manifest, args.index_dir, args.embedding_cache_dir,
+        create_chunker(args.model_path), embedder
+    )
+    version = publish_knowledge_base(vectors, stats, embedding_store, manifest, args.index_dir)
+
+    print(f"Published bundle {version} to {args.index_dir}")
+    print(f"  chunks: {stats['chunks']} (embedded {stats['embedded']}, removed {stats['removed']})")
+    split_stats = stats['split']
+    print(f"  documents split: {split_stats['split']} ({split_stats['cached']} unchanged, chunks reused)")
+    dedup_stats = stats['dedup']
+    print(f"  duplicates dropped: {dedup_stats['input'] - dedup_stats['kept']} of {dedup_stats['input']} chunks "
+          f"({dedup_stats['exact_duplicates']} exact, {dedup_stats['near_duplicates']} near)")
+    if stats['chunks_per_sec']:
+        print(f"  throughput: {stats['chunks_per_sec']} chunks/sec on {stats['workers']} worker(s)")
+    if stats['index']:
+        index_stats = stats['index']
+        print(f"  index: {index_stats['description']}, recall@4 {index_stats['recall_at_k']:.1%}, "
+              f"{index_stats['index_bytes'] / 1e6:.1f} MB")
+    print(f"  build time: {stats['build_seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
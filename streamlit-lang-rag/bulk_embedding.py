@@ -0,0 +1,117 @@
+"""
+Embedding backends and parallel bulk embedding for index builds.
+
+``create_embeddings`` builds the configured LangChain embeddings object.
+``BulkEmbedder`` embeds large text lists in length-sorted batches (so each
+batch is padded to similar lengths) and, for big builds, shards the batches
+across a process pool with one single-threaded model per worker. Batches are
+yielded as soon as they finish so callers can stream vectors into the index.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+# Below this many texts the pool start-up (one model load per worker) costs
+# more than it saves, so embedding stays in-process
+MIN_PARALLEL_TEXTS = 2000
+
+
+def create_embeddings(backend: str, model_path, intra_op_threads: int = 0):
+    """Build the embeddings object for backend ('huggingface' or 'onnx')"""
+    if backend == "onnx":
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(str(model_path), intra_op_threads=intra_op_threads)
+
+    # Imported lazily so the ONNX backend never pulls in torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if intra_op_threads:
+        import torch
+        torch.set_num_threads(intra_op_threads)
+    return HuggingFaceEmbeddings(
+        model_name=str(model_path),
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+# --- Process pool workers ---
+_worker_embeddings = None
+
+
+def _init_worker(backend: str, model_path: str):
+    """Load one single-threaded model per worker process"""
+    global _worker_embeddings
+    _worker_embeddings = create_embeddings(backend, model_path, intra_op_threads=1)
+
+
+def _embed_in_worker(positions: list, texts: list) -> tuple:
+    return positions, np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+class BulkEmbedder:
+    """Embeds text lists in length-sorted batches, optionally across a process pool"""
+
+    def __init__(self, embeddings=None, backend: str = None, model_path=None, workers: int = 1, batch_size: int = 64):
+        self.embeddings = embeddings
+        self.backend = backend
+        self.model_path = str(model_path) if model_path else None
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.last_stats = None
+
+    def _batches(self, texts: list) -> list:
+        """Split positions into batches of similar length, longest first"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+    def _use_pool(self, texts: list) -> bool:
+        return (
+            self.workers > 1
+            and self.backend is not None
+            and self.model_path is not None
+            and len(texts) >= MIN_PARALLEL_TEXTS
+        )
+
+    def embed_batches(self, texts: list):
+        """Yield (positions, vectors) per finished batch.
+
+        positions index into texts; batches arrive in completion order.
+        Throughput is recorded in last_stats once the generator is exhausted.
+        """
+        start_time = time.time()
+        batches = self._batches(texts)
+        workers = 1
+
+        if self._use_pool(texts):
+            workers = min(self.workers, len(batches))
+            # spawn: never fork a process that holds Streamlit/torch threads
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.backend, self.model_path)
+            ) as pool:
+                futures = [
+                    pool.submit(_embed_in_worker, batch, [texts[i] for i in batch])
+                    for batch in batches
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    yield future.result()
+        else:
+            embeddings = self.embeddings
+            if embeddings is None:
+                embeddings = create_embeddings(self.backend, self.model_path)
+            for batch in batches:
+                vectors = embeddings.embed_documents([texts[i] for i in batch])
+                yield batch, np.asarray(vectors, dtype=np.float32)
+
+        seconds = max(time.time() - start_time, 1e-9)
+        self.last_stats = {
+            "chunks": len(texts),
+            "workers": workers,
+            "seconds": round(seconds, 2),
+            "chunks_per_sec": round(len(texts) / seconds, 1)
+        }
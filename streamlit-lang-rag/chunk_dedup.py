@@ -0,0 +1,181 @@
+"""
+Duplicate and near-duplicate chunk removal before embedding.
+
+Chunks with the same normalised text are collapsed first. The remaining
+chunks get a MinHash signature over word 5-gram shingles; LSH banding finds
+candidate pairs and pairs whose estimated Jaccard similarity reaches the
+threshold are merged. Only chunks with the same category and region are
+compared. Each group keeps its first chunk, which records where the dropped
+copies came from in ``duplicate_sources``/``duplicate_count``.
+
+Shingles are hashed with crc32 and the permutations use a fixed seed, so the
+same corpus always deduplicates the same way (and chunk ids stay stable
+across builds).
+"""
+import hashlib
+import re
+import time
+import zlib
+
+import numpy as np
+from langchain.schema import Document
+
+DEDUP_THRESHOLD = 0.85
+NUM_PERM = 128
+# 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a bucket
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r'\w+')
+
+
+def dedup_settings(threshold: float = DEDUP_THRESHOLD) -> dict:
+    """Settings recorded in the index manifest"""
+    return {"threshold": threshold, "num_perm": NUM_PERM, "bands": LSH_BANDS, "shingle_words": SHINGLE_WORDS}
+
+
+def _normalized_key(text: str) -> bytes:
+    return hashlib.sha1(" ".join(_WORD.findall(text.lower())).encode('utf-8')).digest()
+
+
+def _shingles(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return np.fromiter({zlib.crc32(g.encode('utf-8')) & _PRIME for g in grams}, dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a * x + b) mod (2^31 - 1)"""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        # a, x < 2^31, so a * x + b fits in uint64
+        return ((np.outer(shingles, self.a) + self.b) % _PRIME).min(axis=0)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> bool:
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return False
+        # The earliest chunk stays the group's representative
+        self.parent[max(root_i, root_j)] = min(root_i, root_j)
+        return True
+
+
+def find_duplicate_groups(texts: list, threshold: float = DEDUP_THRESHOLD) -> tuple:
+    """Group positions of duplicate and near-duplicate texts.
+
+    Returns (groups, exact_merges, near_merges); groups maps the first
+    position of each group to all its positions, in order.
+    """
+    groups = _UnionFind(len(texts))
+
+    exact_merges = 0
+    first_by_key = {}
+    for i, text in enumerate(texts):
+        key = _normalized_key(text)
+        if key in first_by_key:
+            exact_merges += groups.union(first_by_key[key], i)
+        else:
+            first_by_key[key] = i
+
+    # Texts without words only match exactly
+    hasher = MinHasher()
+    representatives, signatures = [], []
+    for i in first_by_key.values():
+        shingles = _shingles(texts[i])
+        if len(shingles):
+            representatives.append(i)
+            signatures.append(hasher.signature(shingles))
+
+    near_merges = 0
+    if len(representatives) > 1:
+        signatures = np.vstack(signatures)
+        rows = NUM_PERM // LSH_BANDS
+        candidates = set()
+        for band in range(LSH_BANDS):
+            buckets = {}
+            for pos, band_signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                buckets.setdefault(band_signature.tobytes(), []).append(pos)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        candidates.add((members[x], members[y]))
+
+        for p, q in sorted(candidates):
+            if (signatures[p] == signatures[q]).mean() >= threshold:
+                near_merges += groups.union(representatives[p], representatives[q])
+
+    grouped = {}
+    for i in range(len(texts)):
+        grouped.setdefault(groups.find(i), []).append(i)
+    return grouped, exact_merges, near_merges
+
+
+def _provenance(document: Document) -> str:
+    return document.metadata.get("source_pdf") or document.metadata.get("source", "unknown")
+
+
+def _partition(document: Document) -> tuple:
+    metadata = document.metadata
+    return metadata.get("category"), metadata.get("region") or metadata.get("state")
+
+
+def deduplicate_documents(documents: list, threshold: float = DEDUP_THRESHOLD) -> tuple:
+    """Collapse duplicate chunks, keeping the first of each group.
+
+    Chunks only merge within the same category and region, so the kept copy
+    still passes every metadata filter the dropped copies would have.
+    Returns (documents, stats).
+    """
+    start_time = time.time()
+    partitions = {}
+    for i, document in enumerate(documents):
+        partitions.setdefault(_partition(document), []).append(i)
+
+    kept = {}
+    exact_merges = near_merges = 0
+    for positions in partitions.values():
+        groups, exact, near = find_duplicate_groups([documents[i].page_content for i in positions], threshold)
+        exact_merges += exact
+        near_merges += near
+        for first, members in groups.items():
+            document = documents[positions[first]]
+            if len(members) > 1:
+                document = Document(
+                    page_content=document.page_content,
+                    metadata={
+                        **document.metadata,
+                        "duplicate_sources": sorted({_provenance(documents[positions[m]]) for m in members[1:]}),
+                        "duplicate_count": len(members) - 1
+                    }
+                )
+            kept[positions[first]] = document
+
+    stats = {
+        "input": len(documents),
+        "kept": len(kept),
+        "exact_duplicates": exact_merges,
+        "near_duplicates": near_merges,
+        "seconds": round(time.time() - start_time, 2)
+    }
+    return [kept[i] for i in sorted(kept)], stats
@@ -0,0 +1,191 @@
+"""
+Token-budgeted context assembly for the RAG prompt.
+
+``ContextPacker`` turns the retrieved chunks into the passages that are
+pasted into the prompt:
+
+1. Chunks that are neighbours in the same source document (consecutive
+   ``chunk_index``) are merged into one passage and the text the chunker
+   repeated as overlap is removed at each seam.
+2. Passages are ranked by their most relevant chunk and added until the
+   token budget (counted with tiktoken) is used up; the best passage is
+   truncated rather than dropped if it alone exceeds the budget.
+
+Every packed document records its size in ``context_tokens``, so the tokens
+sent with a request can be reported from the chain's ``context`` output.
+
+The cl100k_base encoding file ships with the app in ``tiktoken_cache/``
+(tiktoken's cache layout: named by the sha1 of its download URL), so packing
+works offline and never waits on a download. If it cannot be loaded, tokens
+are estimated from the character count instead.
+"""
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, List
+
+import tiktoken
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+CONTEXT_TOKEN_BUDGET = 1200
+TOKEN_ENCODING = "cl100k_base"
+TIKTOKEN_CACHE_DIR = Path(__file__).resolve().parent / "tiktoken_cache"
+# Cache file names of the encodings shipped in TIKTOKEN_CACHE_DIR
+ENCODING_CACHE_FILES = {"cl100k_base": "9b5ad71b2ce5302211f9c61530b329a4922fc6a4"}
+# Token estimate without an encoding (English text averages ~4 characters per token)
+CHARS_PER_TOKEN = 4
+# Overlaps shorter than this are treated as coincidence, not as chunker overlap
+MIN_OVERLAP_CHARS = 2
+MAX_OVERLAP_CHARS = 2000
+
+# Metadata that differs between chunks of one source document
+_CHUNK_FIELDS = ("chunk_index", "duplicate_sources", "duplicate_count", "context_tokens", "merged_chunks")
+
+logger = logging.getLogger(__name__)
+
+
+def load_encoding(name: str):
+    """The tiktoken encoding from the local cache, or None when it is not available.
+
+    tiktoken downloads a missing encoding (with no timeout), so it is only
+    asked for encodings whose file is already in the cache directory.
+    """
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", str(TIKTOKEN_CACHE_DIR))
+    cache_file = ENCODING_CACHE_FILES.get(name)
+    if cache_file is None or not (Path(os.environ["TIKTOKEN_CACHE_DIR"]) / cache_file).is_file():
+        logger.warning("tiktoken encoding %s is not in %s; estimating tokens from characters",
+                       name, os.environ["TIKTOKEN_CACHE_DIR"])
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not load tiktoken encoding %s (%s); estimating tokens from characters", name, e)
+        return None
+
+
+def passage_key(metadata: dict) -> str:
+    """Identity of a chunk's source document"""
+    return json.dumps(
+        {key: value for key, value in metadata.items() if key not in _CHUNK_FIELDS}, sort_keys=True, default=str
+    )
+
+
+def join_overlapping(previous: str, text: str) -> str:
+    """Concatenate two neighbouring chunks, dropping the longest suffix of previous that text repeats.
+
+    Chunks are exact slices of their document, starting with the separator
+    the splitter cut at (". ", a newline or a space), so chunks without
+    overlap are simply contiguous. Chunks stripped of that whitespace (by
+    older chunkers) get a space between two words.
+    """
+    tail = previous[-MAX_OVERLAP_CHARS:]
+    for start in range(max(len(tail) - len(text), 0), len(tail) - MIN_OVERLAP_CHARS + 1):
+        if text.startswith(tail[start:]):
+            return previous + text[len(tail) - start:]
+    if previous[-1:].isalnum() and text[:1].isalnum():
+        return previous + " " + text
+    return previous + text
+
+class ContextPacker:
+    """Merges neighbouring chunks and fills a token budget by relevance"""
+
+    def __init__(self, max_tokens: int = CONTEXT_TOKEN_BUDGET, encoding: str = TOKEN_ENCODING):
+        self.max_tokens = max_tokens
+        self.encoding = load_encoding(encoding)
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The head of text that fits max_tokens"""
+        if self.encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def merge(self, documents: list) -> list:
+        """Passages of neighbouring chunks, ordered by their most relevant chunk"""
+        groups = {}
+        for rank, doc in enumerate(documents):
+            groups.setdefault(passage_key(doc.metadata), []).append((doc.metadata.get("chunk_index"), rank, doc))
+
+        passages = []
+        for members in groups.values():
+            members.sort(key=lambda member: (member[0] is None, member[0] or 0, member[1]))
+            run = [members[0]]
+            for member in members[1:]:
+                previous_index = run[-1][0]
+                if previous_index is not None and member[0] is not None and member[0] - previous_index <= 1:
+                    if member[0] != previous_index:
+                        run.append(member)
+                else:
+                    passages.append(run)
+                    run = [member]
+            passages.append(run)
+
+        merged = []
+        for run in sorted(passages, key=lambda run: min(rank for _, rank, _ in run)):
+            text = run[0][2].page_content
+            for _, _, doc in run[1:]:
+                text = join_overlapping(text, doc.page_content)
+            metadata = dict(run[0][2].metadata)
+            if len(run) > 1:
+                metadata["merged_chunks"] = len(run)
+            merged.append(Document(page_content=text, metadata=metadata))
+        return merged
+
+    def pack(self, documents: list) -> tuple:
+        """Passages that fit the budget, most relevant first. Returns (documents, stats)."""
+        packed, used, dropped = [], 0, 0
+        passages = self.merge(documents)
+        for passage in passages:
+            tokens = self.count_tokens(passage.page_content)
+            if used + tokens > self.max_tokens:
+                if packed:
+                    dropped += 1
+                    continue
+                # Nothing fits yet: keep the head of the best passage
+                passage = Document(
+                    page_content=self.truncate(passage.page_content, self.max_tokens),
+                    metadata=passage.metadata
+                )
+                tokens = self.count_tokens(passage.page_content)
+            passage.metadata["context_tokens"] = tokens
+            packed.append(passage)
+            used += tokens
+
+        stats = {
+            "chunks": len(documents),
+            "passages": len(packed),
+            "merged": len(documents) - len(passages),
+            "dropped": dropped,
+            "tokens": used,
+            "budget": self.max_tokens
+        }
+        return packed, stats
+
+
+def context_tokens(documents: list) -> int:
+    """Tokens of packed context documents, 0 for unpacked ones"""
+    return sum(doc.metadata.get("context_tokens", 0) for doc in documents)
+
+
+class PackedRetriever(BaseRetriever):
+    """Retriever whose results are packed into the token budget before they reach the prompt"""
+
+    retriever: Any
+    packer: Any
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        packed, stats = self.packer.pack(documents)
+        logger.info(
+            "Context: %s/%s tokens in %s passages from %s chunks (%s merged, %s dropped)",
+            stats['tokens'], stats['budget'], stats['passages'], stats['chunks'], stats['merged'], stats['dropped']
+        )
+        return packed
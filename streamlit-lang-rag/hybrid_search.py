@@ -0,0 +1,238 @@
+"""
+Hybrid lexical + dense retrieval.
+
+``LexicalIndex`` is a BM25 inverted index over the chunks of a bundle, built
+when the bundle is saved and stored next to the FAISS files. Postings are
+kept in CSR arrays (term -> chunk positions) with the BM25 weight of every
+posting precomputed, so scoring a query is one array slice and add per query
+term. Positions are FAISS index positions, so both result lists refer to the
+same chunks.
+
+``hybrid_search`` runs the dense and the lexical search and merges the two
+rankings with reciprocal-rank fusion: exact terms such as scheme names,
+pest species or statistics values surface even when the bge vectors miss
+them, and conceptual questions still rank by meaning.
+"""
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from mmr import select_diverse
+
+LEXICAL_DIR = "lexical"
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+DEFAULT_FETCH_K = 20
+
+_TOKEN = re.compile(r'\w+')
+_COMPOUND = re.compile(r'\w+(?:-\w+)+')
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or that the their this to was "
+    "were which with what how when where who why do does can i my me we our you your".split()
+)
+
+
+def lexical_settings() -> dict:
+    """Settings recorded in the index manifest"""
+    return {"bm25_k1": BM25_K1, "bm25_b": BM25_B, "tokenizer": "word+compound-v1"}
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens without stopwords; 'PM-KISAN' also yields 'pmkisan'"""
+    text = text.lower()
+    tokens = [token for token in _TOKEN.findall(text) if token not in _STOPWORDS]
+    tokens.extend(compound.replace("-", "") for compound in _COMPOUND.findall(text))
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 inverted index with precomputed posting weights"""
+
+    def __init__(self, terms: dict, indptr: np.ndarray, positions: np.ndarray, weights: np.ndarray, n_docs: int):
+        self.terms = terms
+        self.indptr = indptr
+        self.positions = positions
+        self.weights = weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, texts: list, k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        terms = {}
+        term_ids, positions, frequencies = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[position] = sum(counts.values())
+            for term, frequency in counts.items():
+                term_ids.append(terms.setdefault(term, len(terms)))
+                positions.append(position)
+                frequencies.append(frequency)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int32)
+        frequencies = np.asarray(frequencies, dtype=np.float32)
+
+        order = np.lexsort((positions, term_ids))
+        term_ids, positions, frequencies = term_ids[order], positions[order], frequencies[order]
+
+        document_frequency = np.bincount(term_ids, minlength=len(terms))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=indptr[1:])
+
+        n_docs = len(texts)
+        idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = max(float(doc_lengths.mean()) if n_docs else 0.0, 1.0)
+        length_norm = k1 * (1 - b + b * doc_lengths[positions] / average_length)
+        weights = idf[term_ids] * frequencies * (k1 + 1) / (frequencies + length_norm)
+
+        return cls(terms, indptr, positions, weights.astype(np.float32), n_docs)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "LexicalIndex":
+        """Index the chunks of a langchain FAISS store in index order"""
+        texts = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).page_content
+            for i in range(vectorstore.index.ntotal)
+        ]
+        return cls.build(texts)
+
+    def search(self, query: str, k: int, positions: np.ndarray = None) -> list:
+        """Top-k (position, score) pairs by BM25, optionally only among positions"""
+        term_ids = {self.terms[term] for term in tokenize(query) if term in self.terms}
+        if not term_ids or not self.n_docs:
+            return []
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.positions[start:end]] += self.weights[start:end]
+
+        if positions is None:
+            matched = np.flatnonzero(scores)
+        else:
+            matched = positions[scores[positions] > 0]
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(position), float(scores[position])) for position in matched]
+
+    def save(self, bundle_dir):
+        lexical_dir = Path(bundle_dir) / LEXICAL_DIR
+        lexical_dir.mkdir(parents=True, exist_ok=True)
+        np.save(lexical_dir / "indptr.npy", self.indptr)
+        np.save(lexical_dir / "positions.npy", self.positions)
+        np.save(lexical_dir / "weights.npy", self.weights)
+        with open(lexical_dir / "terms.json", 'w', encoding='utf-8') as f:
+            json.dump({"n_docs": self.n_docs, "terms": sorted(self.terms, key=self.terms.get)}, f)
+
+    @classmethod
+    def load(cls, bundle_dir, mmap: bool = False):
+        """Load a bundle's lexical index, or None if the bundle has none"""
+        lexical_dir = Path(bundle_dir) / LEXICAL_DIR
+        if not (lexical_dir / "terms.json").exists():
+            return None
+        mmap_mode = 'r' if mmap else None
+        with open(lexical_dir / "terms.json", 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        return cls(
+            {term: term_id for term_id, term in enumerate(stored["terms"])},
+            np.load(lexical_dir / "indptr.npy", mmap_mode=mmap_mode),
+            np.load(lexical_dir / "positions.npy", mmap_mode=mmap_mode),
+            np.load(lexical_dir / "weights.npy", mmap_mode=mmap_mode),
+            stored["n_docs"]
+        )
+
+
+def fused_scores(rankings: list, k: int = RRF_K) -> dict:
+    """Reciprocal-rank fusion scores: score(id) = sum of 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """Merge ranked lists of ids, best fused score first"""
+    scores = fused_scores(rankings, k)
+    return sorted(scores, key=lambda item: (-scores[item], item))
+
+
+def filter_positions(vectorstore, filter: dict):
+    """Positions matching filter, or None for an unfiltered search"""
+    partitions = getattr(vectorstore, "partitions", None)
+    if not filter or partitions is None:
+        return None
+    return partitions.select(filter)
+
+
+def embed_query(vectorstore, query: str) -> np.ndarray:
+    return np.asarray(vectorstore.embeddings.embed_query(query), dtype=np.float32)
+
+
+def dense_search(vectorstore, query: str, k: int, positions: np.ndarray = None, embedding: np.ndarray = None) -> list:
+    """FAISS positions of the k nearest chunks, optionally only among positions"""
+    if embedding is None:
+        embedding = embed_query(vectorstore, query)
+    if positions is not None:
+        return vectorstore.partitions.search(vectorstore.index, embedding, k, positions)
+    _, found = vectorstore.index.search(embedding[None, :], min(k, vectorstore.index.ntotal))
+    return [int(position) for position in found[0] if position >= 0]
+
+
+def documents_at(vectorstore, positions: list) -> list:
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]) for position in positions]
+
+
+def fuse_and_select(vectorstore, embedding: np.ndarray, rankings: list, k: int, rrf_k: int = RRF_K,
+                    lambda_mult: float = None, score_threshold: float = None) -> list:
+    """Top-k positions of fused rankings, optionally diversified and cut off (see mmr.py)"""
+    scores = fused_scores(rankings, rrf_k)
+    candidates = sorted(scores, key=lambda item: (-scores[item], item))
+    if lambda_mult is None and score_threshold is None:
+        return candidates[:k]
+    return select_diverse(
+        vectorstore, embedding, candidates, k, lambda_mult, score_threshold,
+        relevance=[scores[position] for position in candidates]
+    )
+
+
+def similarity_search(vectorstore, query: str, k: int = 4, fetch_k: int = DEFAULT_FETCH_K, filter: dict = None,
+                      lambda_mult: float = None, score_threshold: float = None) -> list:
+    """Top-k documents by dense similarity, searching only the filtered partitions.
+
+    With lambda_mult or score_threshold, k are picked from fetch_k candidates.
+    """
+    embedding = embed_query(vectorstore, query)
+    positions = filter_positions(vectorstore, filter)
+    if lambda_mult is None and score_threshold is None:
+        return documents_at(vectorstore, dense_search(vectorstore, query, k, positions, embedding=embedding))
+    candidates = dense_search(vectorstore, query, max(fetch_k, k), positions, embedding=embedding)
+    return documents_at(vectorstore, select_diverse(
+        vectorstore, embedding, candidates, k, lambda_mult, score_threshold
+    ))
+
+
+def hybrid_search(vectorstore, query: str, k: int = 4, fetch_k: int = DEFAULT_FETCH_K, rrf_k: int = RRF_K,
+                  filter: dict = None, lambda_mult: float = None, score_threshold: float = None) -> list:
+    """Top-k documents by reciprocal-rank fusion of dense and BM25 results.
+
+    filter (see partitions.py) is pushed down into both searches. With
+    lambda_mult the k are picked from the fused candidates by MMR; chunks
+    below score_threshold cosine similarity are dropped. Falls back to dense
+    results when the store has no lexical index.
+    """
+    embedding = embed_query(vectorstore, query)
+    positions = filter_positions(vectorstore, filter)
+    rankings = [dense_search(vectorstore, query, fetch_k, positions, embedding=embedding)]
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    if lexical_index is not None:
+        rankings.append([position for position, _ in lexical_index.search(query, fetch_k, positions)])
+
+    return documents_at(vectorstore, fuse_and_select(
+        vectorstore, embedding, rankings, k, rrf_k, lambda_mult, score_threshold
+    ))
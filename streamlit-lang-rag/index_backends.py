@@ -0,0 +1,162 @@
+"""
+Vector index backends for the knowledge base.
+
+Every build first produces an exact float32 flat index; ``convert_vectorstore``
+then swaps in the configured backend:
+
+* ``flat``  - exact search, vectors stored as float32, float16 or int8
+* ``hnsw``  - graph search (HNSW32), same storage options
+* ``ivfpq`` - inverted lists with product-quantised codes (storage ignored)
+
+Quantised variants are trained on the corpus vectors at build time, and
+recall@k and query latency against the exact index are measured on a sample
+of the corpus so the RAM/latency savings can be weighed against lost recall.
+"""
+import math
+import time
+
+import faiss
+import numpy as np
+
+INDEX_KINDS = ("flat", "hnsw", "ivfpq")
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+# Sub-vector count for PQ: 384-dim bge vectors -> 48 sub-vectors of 8 dims
+PQ_SUBVECTORS = 48
+# faiss wants ~39 training points per centroid
+TRAINING_POINTS_PER_CENTROID = 39
+
+RECALL_QUERIES = 200
+RECALL_K = 4
+
+_STORAGE_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+
+def is_exact(index_settings: dict) -> bool:
+    """True for the plain float32 flat index langchain builds by default"""
+    return index_settings.get("kind", "flat") == "flat" and index_settings.get("storage", "float32") == "float32"
+
+
+def supports_removal(index_settings: dict) -> bool:
+    """Whether an index can be patched in place, or must be rebuilt when chunks are removed.
+
+    HNSW graphs cannot drop vectors. IVF indexes can, but remove_ids keeps
+    the original ids of the surviving vectors while langchain renumbers its
+    position -> docstore id map to 0..n-1, so results would point at the
+    wrong chunks.
+    """
+    return index_settings.get("kind", "flat") not in ("hnsw", "ivfpq")
+
+
+def factory_string(kind: str, storage: str, n_vectors: int, dim: int) -> tuple:
+    """Return (faiss index_factory string, effective kind, effective storage).
+
+    IVF-PQ falls back to a float16 flat index when there are too few vectors
+    to train it.
+    """
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}', expected one of {INDEX_KINDS}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+
+    if kind == "ivfpq":
+        # PQ codebooks: 2^nbits centroids per sub-vector, each needing training points
+        nbits = min(8, int(math.log2(max(n_vectors, 1) / TRAINING_POINTS_PER_CENTROID))) if n_vectors else 0
+        if nbits < 4 or dim % PQ_SUBVECTORS:
+            return "SQfp16", "flat", "float16"
+        nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // TRAINING_POINTS_PER_CENTROID))
+        return f"IVF{nlist},PQ{PQ_SUBVECTORS}x{nbits}", "ivfpq", "pq"
+
+    code = _STORAGE_CODES[storage]
+    if kind == "hnsw":
+        return (f"HNSW{HNSW_M}" if code == "Flat" else f"HNSW{HNSW_M},{code}"), "hnsw", storage
+    return code, "flat", storage
+
+
+def build_faiss_index(vectors: np.ndarray, kind: str, storage: str) -> tuple:
+    """Train (when needed) and fill a faiss index of the requested kind.
+
+    Returns (index, factory string, effective kind, effective storage).
+    """
+    n_vectors, dim = vectors.shape
+    description, effective_kind, effective_storage = factory_string(kind, storage, n_vectors, dim)
+
+    index = faiss.index_factory(dim, description, faiss.METRIC_L2)
+    if effective_kind == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+
+    if effective_kind == "hnsw":
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif effective_kind == "ivfpq":
+        index.nprobe = IVF_NPROBE
+
+    return index, description, effective_kind, effective_storage
+
+
+def compare_to_exact(exact_index, index, vectors: np.ndarray, k: int = RECALL_K, n_queries: int = RECALL_QUERIES) -> dict:
+    """Recall@k and mean per-query latency of index against exact_index.
+
+    A sample of the corpus vectors is used as queries.
+    """
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    k = min(k, len(vectors))
+
+    start = time.perf_counter()
+    _, expected = exact_index.search(queries, k)
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    index_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return {
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "exact_query_ms": round(1000 * exact_seconds / len(queries), 3),
+        "index_query_ms": round(1000 * index_seconds / len(queries), 3)
+    }
+
+
+def convert_vectorstore(vectorstore, index_settings: dict) -> tuple:
+    """Replace the exact index of a langchain FAISS store with the configured backend.
+
+    Vector ids are kept in insertion order, so the docstore mapping stays
+    valid. Returns (vectorstore, stats).
+    """
+    exact_index = vectorstore.index
+    stats = {
+        "kind": "flat",
+        "storage": "float32",
+        "description": "Flat",
+        "recall_at_k": 1.0,
+        "exact_query_ms": None,
+        "index_query_ms": None,
+        "exact_bytes": exact_index.ntotal * exact_index.d * 4,
+        "index_bytes": exact_index.ntotal * exact_index.d * 4
+    }
+    if is_exact(index_settings) or exact_index.ntotal == 0:
+        return vectorstore, stats
+
+    vectors = exact_index.reconstruct_n(0, exact_index.ntotal)
+    index, description, kind, storage = build_faiss_index(
+        vectors, index_settings.get("kind", "flat"), index_settings.get("storage", "float32")
+    )
+
+    stats.update({
+        "kind": kind,
+        "storage": storage,
+        "description": description,
+        "index_bytes": len(faiss.serialize_index(index))
+    })
+    stats.update(compare_to_exact(exact_index, index, vectors))
+    vectorstore.index = index
+    return vectorstore, stats
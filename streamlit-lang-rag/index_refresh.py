@@ -0,0 +1,164 @@
+"""
+Zero-downtime knowledge base refresh.
+
+``LiveIndex`` holds the vector store that currently serves queries. Its
+retrievers look the store up once per query, so swapping in a new store is a
+single reference assignment: queries already running finish on the old store
+and the next query uses the new one.
+
+``IndexRefresher`` runs in a daemon thread. It picks up bundles published by
+another process (build_index.py or another pod) and, when a rebuild function
+is given, builds a new bundle next to the live one whenever the knowledge base
+changed, then swaps it in.
+"""
+import fcntl
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from hybrid_search import hybrid_search, similarity_search
+from section_index import hierarchical_search
+from knowledge_index import current_version
+
+REBUILD_LOCK_FILE = ".rebuild.lock"
+
+logger = logging.getLogger(__name__)
+
+
+class LiveIndexRetriever(BaseRetriever):
+    """Retriever that always searches the store currently held by a LiveIndex.
+
+    search_type is any FAISS retriever search type, "hybrid" for BM25 +
+    dense reciprocal-rank fusion (search_kwargs: k, fetch_k, rrf_k) or
+    "hierarchical" for hybrid search within the best crop guide sections
+    (additionally: sections). A partition filter in search_kwargs, or
+    returned by query_filter(query), is pushed down into these searches;
+    lambda_mult (MMR) and score_threshold (cosine cutoff) apply to them too.
+    """
+
+    live_index: Any
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = {}
+    query_filter: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # Read the reference once: a swap mid-query does not affect this query
+        vectorstore = self.live_index.vectorstore
+        search_kwargs = dict(self.search_kwargs)
+        if self.query_filter is not None and "filter" not in search_kwargs:
+            query_filter = self.query_filter(query)
+            if query_filter:
+                search_kwargs["filter"] = query_filter
+
+        if self.search_type == "hybrid":
+            return hybrid_search(vectorstore, query, **search_kwargs)
+        if self.search_type == "hierarchical":
+            return hierarchical_search(vectorstore, query, **search_kwargs)
+        if self.search_type == "similarity" and search_kwargs.keys() & {"filter", "lambda_mult", "score_threshold"}:
+            return similarity_search(vectorstore, query, **search_kwargs)
+        retriever = vectorstore.as_retriever(search_type=self.search_type, search_kwargs=search_kwargs)
+        return retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+class LiveIndex:
+    """The serving vector store, swappable while queries are running"""
+
+    def __init__(self, vectorstore, version: str = None):
+        self._lock = threading.Lock()
+        self.vectorstore = vectorstore
+        self.version = version
+        self.swapped_at = time.time()
+
+    @property
+    def ntotal(self) -> int:
+        return self.vectorstore.index.ntotal
+
+    def swap(self, vectorstore, version: str = None):
+        """Atomically make vectorstore the serving store"""
+        with self._lock:
+            self.vectorstore = vectorstore
+            self.version = version
+            self.swapped_at = time.time()
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: dict = None,
+                     query_filter=None) -> LiveIndexRetriever:
+        return LiveIndexRetriever(
+            live_index=self, search_type=search_type, search_kwargs=search_kwargs or {}, query_filter=query_filter
+        )
+
+
+class IndexRefresher:
+    """Background thread that keeps a LiveIndex on the newest bundle.
+
+    load_fn() loads the live bundle from index_dir. rebuild_fn(), if given,
+    builds and publishes a new bundle when the knowledge base changed and
+    returns True if it published one. Only one process per index_dir rebuilds
+    at a time; the others pick the result up through CURRENT.
+    """
+
+    def __init__(self, live_index: LiveIndex, index_dir, load_fn, rebuild_fn=None, interval: float = 300):
+        self.live_index = live_index
+        self.index_dir = Path(index_dir)
+        self.load_fn = load_fn
+        self.rebuild_fn = rebuild_fn
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-index-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_once()
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the current index; try again next interval
+                self.last_error = e
+                logger.exception("Knowledge base refresh failed")
+
+    def check_once(self) -> bool:
+        """Rebuild if needed, then swap to the published bundle if it is newer.
+
+        Returns True when the serving index was swapped.
+        """
+        if self.rebuild_fn is not None:
+            self._rebuild_exclusively()
+
+        version_dir = current_version(self.index_dir)
+        if version_dir is None or version_dir.name == self.live_index.version:
+            return False
+
+        vectorstore = self.load_fn()
+        if vectorstore is None:
+            return False
+        self.live_index.swap(vectorstore, version_dir.name)
+        logger.info("Knowledge base index swapped to %s", version_dir.name)
+        return True
+
+    def _rebuild_exclusively(self):
+        """Run rebuild_fn unless another process is already rebuilding this index"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.index_dir / REBUILD_LOCK_FILE, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                return self.rebuild_fn()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
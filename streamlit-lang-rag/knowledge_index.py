@@ -0,0 +1,489 @@
+"""
+Persistent storage for the FAISS knowledge base index.
+
+An index directory holds versioned bundles under ``versions/`` and a
+``CURRENT`` file naming the live one. A bundle holds the files written by
+``FAISS.save_local``, a BM25 index over the chunks, the chunks (as JSON lines
+and as a SQLite docstore) and their embedding matrix, and a ``manifest.json`` that fingerprints everything the
+index was built from (knowledge base files, splitter settings, embedding
+model, index backend).
+The app loads the live bundle while the manifest still matches and rebuilds
+it otherwise; offline builds (build_index.py) publish bundles the app only
+loads.
+
+Chunks are content addressed: a chunk's docstore id is the hash of its text
+and metadata, and its vector is cached by the hash of its text. When the
+knowledge base changes, the saved index is patched in place - vectors of
+deleted chunks are dropped and only chunks with new text are re-embedded.
+
+Served indexes are memory-mapped read-only, so every Streamlit process on a
+host shares the same page-cache pages for the vectors instead of holding a
+private copy. Their chunk text stays on disk in the SQLite docstore and is
+read only for the documents a search returns.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from bulk_embedding import BulkEmbedder
+from hybrid_search import LexicalIndex
+from index_backends import convert_vectorstore, supports_removal
+from partitions import PartitionIndex
+from section_index import SectionIndex
+from sqlite_docstore import FullTextIndex, SQLiteDocstore, write_docstore
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Bundle layout: <index_dir>/versions/<version>/ with CURRENT naming the live one
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+CHUNKS_FILE = "chunks.jsonl"
+VECTORS_FILE = "vectors.npy"
+KEEP_VERSIONS = 3
+
+# Read-only mmap of the vector storage. IVF inverted lists are mapped with
+# IO_FLAG_MMAP; flat/SQ codes and HNSW storage need IO_FLAG_MMAP_IFC (faiss
+# >= 1.9), on which IO_FLAG_MMAP has no effect. faiss rejects IVF indexes read
+# with both flags, so they are picked per index type.
+IVF_MMAP_FLAGS = faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP
+MMAP_FLAGS = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+# What a missing, partial or unreadable bundle raises while being opened
+BUNDLE_ERRORS = (OSError, RuntimeError, ValueError, KeyError, EOFError, pickle.UnpicklingError, sqlite3.Error)
+
+logger = logging.getLogger(__name__)
+
+# Model weights and rasters are fingerprinted by size plus sampled bytes
+# instead of a full read, so checking the manifest stays cheap
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+SAMPLE_BYTES = 1024 * 1024
+
+
+def fingerprint_file(path: Path) -> str:
+    """Return a sha256 fingerprint of a single file"""
+    digest = hashlib.sha256()
+    size = path.stat().st_size
+
+    with open(path, 'rb') as f:
+        if size <= LARGE_FILE_BYTES:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        else:
+            digest.update(str(size).encode())
+            digest.update(f.read(SAMPLE_BYTES))
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(SAMPLE_BYTES))
+
+    return digest.hexdigest()
+
+
+def fingerprint_tree(root) -> dict:
+    """Fingerprint every file under root (or root itself when it is a file)"""
+    root = Path(root)
+    if not root.exists():
+        return {}
+    if root.is_file():
+        return {root.name: fingerprint_file(root)}
+
+    return {
+        path.relative_to(root).as_posix(): fingerprint_file(path)
+        for path in sorted(root.rglob('*'))
+        if path.is_file()
+    }
+
+
+def manifest_digest(manifest: dict) -> str:
+    """Digest of the manifest fields that decide whether an index is reusable"""
+    payload = {
+        k: v for k, v in manifest.items()
+        if k not in ("digest", "bundle", "built_at", "chunk_count", "build_stats")
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def build_manifest(sources: dict, splitter_settings: dict, model_path, extra: dict = None, index_settings: dict = None) -> dict:
+    """Describe the inputs of an index build.
+
+    sources maps a label to a knowledge base file or directory, e.g.
+    ``{"soil": "soil_knowledge_base", "crop_cycle": ".../crop_cycle.json"}``.
+    """
+    model_path = Path(model_path)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "sources": {name: fingerprint_tree(path) for name, path in sources.items() if path},
+        "splitter": splitter_settings,
+        "embedding_model": {
+            "name": model_path.name,
+            "files": fingerprint_tree(model_path)
+        },
+        "index": index_settings or {"kind": "flat", "storage": "float32"},
+        "extra": extra or {}
+    }
+    manifest["digest"] = manifest_digest(manifest)
+    return manifest
+
+
+def embedding_model_key(manifest: dict) -> str:
+    """Digest of the embedding model section - vectors are only reusable while it matches"""
+    payload = json.dumps(manifest["embedding_model"], sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def text_key(text: str) -> str:
+    """Content address of a chunk's text, used as the embedding cache key"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def chunk_id(doc) -> str:
+    """Content address of a chunk (text and metadata), used as its docstore id"""
+    payload = doc.page_content + "\x00" + json.dumps(doc.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChunkEmbeddingStore:
+    """Content-addressed cache of chunk embeddings keyed by the hash of the chunk text"""
+
+    KEYS_FILE = "keys.json"
+    VECTORS_FILE = "vectors.npy"
+
+    def __init__(self, store_dir, manifest: dict):
+        self.store_dir = Path(store_dir)
+        self.model_key = embedding_model_key(manifest)
+        self.vectors = {}
+        self._load()
+
+    def _load(self):
+        """Load cached vectors, ignoring them if they came from another model"""
+        try:
+            with open(self.store_dir / self.KEYS_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("model_key") != self.model_key:
+                return
+            matrix = np.load(self.store_dir / self.VECTORS_FILE, mmap_mode='r')
+            self.vectors = dict(zip(meta["keys"], matrix))
+        except (OSError, ValueError, KeyError):
+            self.vectors = {}
+
+    def get(self, key: str):
+        """Cached vector for a text key, or None"""
+        return self.vectors.get(key)
+
+    def put(self, key: str, vector):
+        self.vectors[key] = np.asarray(vector, dtype=np.float32)
+
+    def prune(self, texts: list):
+        """Drop cached vectors whose text is no longer part of the knowledge base"""
+        live = {text_key(text) for text in texts}
+        self.vectors = {key: vector for key, vector in self.vectors.items() if key in live}
+
+    def save(self):
+        """Write the cache atomically next to the index"""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        keys = list(self.vectors)
+        matrix = np.vstack([self.vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+        tmp_vectors = self.store_dir / f".{self.VECTORS_FILE}.{os.getpid()}.npy"
+        tmp_keys = self.store_dir / f".{self.KEYS_FILE}.{os.getpid()}"
+        np.save(tmp_vectors, matrix)
+        with open(tmp_keys, 'w', encoding='utf-8') as f:
+            json.dump({"model_key": self.model_key, "keys": keys}, f)
+        os.replace(tmp_vectors, self.store_dir / self.VECTORS_FILE)
+        os.replace(tmp_keys, self.store_dir / self.KEYS_FILE)
+
+
+def sync_index(documents: list, embeddings, store: ChunkEmbeddingStore, previous=None, embedder: BulkEmbedder = None,
+               index_settings: dict = None) -> tuple:
+    """Bring an index in line with documents (already split into chunks).
+
+    With a previous index, vectors of chunks that disappeared are deleted and
+    only new chunks are added; otherwise a fresh index is built. Vectors come
+    from store where possible; the remaining texts go through embedder (an
+    in-process BulkEmbedder by default) and each finished batch is added to
+    the index straight away. A fresh index is built exact and then converted
+    to the backend in index_settings (see index_backends).
+
+    Returns (vectorstore, stats).
+    """
+    chunks = {}
+    for doc in documents:
+        chunks.setdefault(chunk_id(doc), doc)
+
+    if previous is not None:
+        existing = set(previous.index_to_docstore_id.values())
+        removed = [cid for cid in existing if cid not in chunks]
+        added = [cid for cid in chunks if cid not in existing]
+    else:
+        removed = []
+        added = list(chunks)
+
+    vectorstore = previous
+    if removed:
+        vectorstore.delete(removed)
+
+    def add_chunks(ids: list):
+        nonlocal vectorstore
+        texts = [chunks[cid].page_content for cid in ids]
+        text_embeddings = [(text, store.get(text_key(text))) for text in texts]
+        metadatas = [chunks[cid].metadata for cid in ids]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+    # Chunks whose text is already embedded go in first, in one call
+    cached = []
+    pending = {}
+    for cid in added:
+        key = text_key(chunks[cid].page_content)
+        if store.get(key) is not None:
+            cached.append(cid)
+        else:
+            pending.setdefault(key, []).append(cid)
+    if cached:
+        add_chunks(cached)
+
+    # Everything else is embedded once per distinct text and streamed into the index
+    embed_stats = None
+    if pending:
+        embedder = embedder or BulkEmbedder(embeddings=embeddings)
+        keys = list(pending)
+        texts = [chunks[pending[key][0]].page_content for key in keys]
+        for positions, vectors in embedder.embed_batches(texts):
+            batch_ids = []
+            for position, vector in zip(positions, vectors):
+                store.put(keys[position], vector)
+                batch_ids.extend(pending[keys[position]])
+            add_chunks(batch_ids)
+        embed_stats = embedder.last_stats
+
+    if vectorstore is None:
+        raise ValueError("No documents to index")
+
+    store.prune([doc.page_content for doc in chunks.values()])
+
+    index_stats = None
+    if previous is None:
+        vectorstore, index_stats = convert_vectorstore(vectorstore, index_settings or {})
+
+    stats = {
+        "chunks": len(chunks),
+        "added": len(added),
+        "removed": len(removed),
+        "embedded": len(pending),
+        "reused": len(added) - sum(len(ids) for ids in pending.values()),
+        "chunks_per_sec": embed_stats["chunks_per_sec"] if embed_stats else None,
+        "workers": embed_stats["workers"] if embed_stats else 0,
+        "index": index_stats
+    }
+    return vectorstore, stats
+
+
+def current_version(index_dir):
+    """Directory of the live bundle named by CURRENT, or None"""
+    index_dir = Path(index_dir)
+    try:
+        name = (index_dir / CURRENT_FILE).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+
+    version_dir = index_dir / VERSIONS_DIR / name
+    return version_dir if name and version_dir.is_dir() else None
+
+
+def read_manifest(version_dir) -> dict:
+    """Return the manifest stored in a bundle, or None if there is none"""
+    if version_dir is None:
+        return None
+    manifest_path = Path(version_dir) / MANIFEST_FILE
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def mmap_flags(index_file) -> int:
+    """faiss.read_index flags mapping index_file read-only, by its index type"""
+    with open(index_file, 'rb') as f:
+        fourcc = f.read(4)
+    # IVF index fourccs start with "Iw" (IwFl, IwPQ, IwSQ, ...)
+    return IVF_MMAP_FLAGS if fourcc.startswith(b"Iw") else MMAP_FLAGS
+
+
+def read_index_dir(version_dir, embeddings, mmap: bool = False, writable: bool = False):
+    """Open the FAISS files of a bundle.
+
+    With mmap the faiss index is mapped read-only from disk and costs no
+    private memory. It must never be patched: faiss aborts the process when
+    vectors are added to mapped storage, which is why load_index_for_update
+    always reads a private copy.
+
+    Unless writable, chunks are served from the bundle's SQLite docstore and
+    index.pkl (the whole corpus text) is not unpickled. Writable stores get
+    the in-memory docstore that sync_index can add to and delete from.
+
+    The bundle's BM25 index (or its docstore's FTS5 table), metadata
+    partitions and section index, if it has them, are attached as
+    ``vectorstore.lexical_index``, ``vectorstore.partitions`` and
+    ``vectorstore.sections`` so they are swapped together with the vectors.
+    """
+    version_dir = Path(version_dir)
+    index_file = version_dir / "index.faiss"
+    docstore = None if writable else SQLiteDocstore.load(version_dir)
+    if docstore is not None:
+        index = faiss.read_index(str(index_file), mmap_flags(index_file) if mmap else 0)
+        vectorstore = FAISS(embeddings, index, docstore, docstore.index_to_docstore_id())
+    elif not mmap:
+        vectorstore = FAISS.load_local(str(version_dir), embeddings, allow_dangerous_deserialization=True)
+    else:
+        index = faiss.read_index(str(index_file), mmap_flags(index_file))
+        with open(version_dir / "index.pkl", 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        vectorstore = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    vectorstore.lexical_index = LexicalIndex.load(version_dir, mmap=mmap)
+    if vectorstore.lexical_index is None and isinstance(docstore, SQLiteDocstore) and docstore.has_fts:
+        # Bundles without BM25 postings still get keyword matches, from the docstore's FTS5 table
+        vectorstore.lexical_index = FullTextIndex(docstore)
+    vectorstore.partitions = PartitionIndex.load(version_dir, version_dir / VECTORS_FILE, mmap=mmap)
+    vectorstore.sections = SectionIndex.load(version_dir, mmap=mmap)
+    return vectorstore
+
+
+def load_index(index_dir, embeddings, manifest: dict = None, mmap: bool = True):
+    """Load the live bundle from index_dir.
+
+    With a manifest, the bundle is only used if it was built from the same
+    inputs; without one (offline builds) it is trusted as is. Returns None
+    when there is no usable bundle.
+    """
+    version_dir = current_version(index_dir)
+    if version_dir is None:
+        return None
+    if manifest is not None:
+        stored = read_manifest(version_dir)
+        if not stored or stored.get("digest") != manifest["digest"]:
+            return None
+
+    try:
+        return read_index_dir(version_dir, embeddings, mmap=mmap)
+    except BUNDLE_ERRORS as e:
+        logger.warning("Could not load index bundle %s: %s", version_dir, e)
+        return None
+
+
+def load_index_for_update(index_dir, embeddings, manifest: dict):
+    """Load the live bundle when it is stale but was built with the same embedding model.
+
+    Its vectors are still valid, so it can be patched with sync_index instead
+    of being rebuilt. Returns None when no such index exists, when the index
+    backend changed, or when the backend cannot delete vectors (HNSW, IVF-PQ).
+    """
+    version_dir = current_version(index_dir)
+    stored = read_manifest(version_dir)
+    if not stored or stored.get("version") != MANIFEST_VERSION:
+        return None
+    if embedding_model_key(stored) != embedding_model_key(manifest):
+        return None
+    if stored.get("index") != manifest["index"] or not supports_removal(manifest["index"]):
+        return None
+
+    try:
+        return read_index_dir(version_dir, embeddings, mmap=False, writable=True)
+    except BUNDLE_ERRORS as e:
+        logger.warning("Could not load index bundle %s for update: %s", version_dir, e)
+        return None
+
+
+def _write_chunks_and_vectors(vectorstore, version_dir: Path, store: ChunkEmbeddingStore):
+    """Write chunk text/metadata and the float32 embedding matrix in index order.
+
+    Returns the matrix, or None when a chunk's vector is not in store.
+    """
+    docs = [
+        (vectorstore.index_to_docstore_id[i], vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]))
+        for i in range(vectorstore.index.ntotal)
+    ]
+
+    with open(version_dir / CHUNKS_FILE, 'w', encoding='utf-8') as f:
+        for cid, doc in docs:
+            f.write(json.dumps({"id": cid, "text": doc.page_content, "metadata": doc.metadata}, default=str) + "\n")
+
+    vectors = [store.get(text_key(doc.page_content)) for _, doc in docs]
+    if not vectors or any(vector is None for vector in vectors):
+        return None
+    matrix = np.vstack(vectors).astype(np.float32)
+    np.save(version_dir / VECTORS_FILE, matrix)
+    return matrix
+
+
+def save_index(vectorstore, index_dir, manifest: dict, store: ChunkEmbeddingStore = None, stats: dict = None) -> str:
+    """Write vectorstore as a new bundle under index_dir and make it the live one.
+
+    A bundle holds the FAISS files, the BM25 index, metadata partitions,
+    section index and SQLite docstore over the same chunks, the manifest (plus build stats) and, when store is
+    given, chunks.jsonl and vectors.npy. It is written to a staging
+    directory, renamed into versions/ and published by atomically replacing
+    CURRENT, so readers never see a half-written bundle. Older bundles beyond
+    KEEP_VERSIONS are removed. Returns the new version name.
+    """
+    index_dir = Path(index_dir)
+    versions_dir = index_dir / VERSIONS_DIR
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{manifest['digest'][:12]}"
+    if (versions_dir / version).exists():
+        version = f"{version}-{os.getpid()}"
+
+    staging = Path(tempfile.mkdtemp(prefix=f".{version}.", dir=versions_dir))
+    try:
+        vectorstore.save_local(str(staging))
+        LexicalIndex.from_vectorstore(vectorstore).save(staging)
+        PartitionIndex.from_vectorstore(vectorstore).save(staging)
+        write_docstore(vectorstore, staging)
+        vectors = _write_chunks_and_vectors(vectorstore, staging, store) if store is not None else None
+        SectionIndex.from_vectorstore(vectorstore, vectors).save(staging)
+
+        stored = dict(
+            manifest,
+            bundle=version,
+            built_at=time.time(),
+            chunk_count=vectorstore.index.ntotal,
+            build_stats=stats or {}
+        )
+        with open(staging / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, indent=2, default=str)
+
+        os.rename(staging, versions_dir / version)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    publish_version(index_dir, version)
+    return version
+
+
+def publish_version(index_dir, version: str):
+    """Point CURRENT at version and drop bundles older than the last KEEP_VERSIONS"""
+    index_dir = Path(index_dir)
+    tmp_current = index_dir / f".{CURRENT_FILE}.{os.getpid()}"
+    tmp_current.write_text(version, encoding='utf-8')
+    os.replace(tmp_current, index_dir / CURRENT_FILE)
+
+    versions = sorted(p for p in (index_dir / VERSIONS_DIR).iterdir() if p.is_dir() and not p.name.startswith('.'))
+    for old in versions[:-KEEP_VERSIONS]:
+        if old.name != version:
+            # Processes still serving an old bundle keep their mmap alive after unlink
+            shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,406 @@
+"""
+Knowledge base loaders shared by the app and the offline index build.
+
+Each loader turns one knowledge base (soil data, crop cycle guides, farmer
+web pages) into LangChain ``Document`` objects with ``category``/``type``
+metadata for retrieval. They run in the app, in the ``build_index.py`` CLI
+and on the index refresher's background thread, so problems are logged
+rather than shown in the Streamlit UI.
+"""
+import json
+import logging
+import re
+from pathlib import Path
+
+import pandas as pd
+from langchain.schema import Document
+from langchain_community.document_loaders import WebBaseLoader
+
+from soil_knowledge import soil_documents
+
+logger = logging.getLogger(__name__)
+
+# Original farming URLs for schemes and general info
+FARMER_URLS = [
+    "https://vikaspedia.in/agriculture/crop-production",
+    "https://vikaspedia.in/agriculture/schemes-for-farmers",
+    "https://vikaspedia.in/agriculture/agri-credit",
+    "https://www.india.gov.in/topics/agriculture"
+]
+
+# Part of the index manifest: bump whenever the loaders produce different
+# documents from the same source files, so saved indexes are rebuilt
+LOADER_VERSION = 2
+
+# crop_cycle.json is read in blocks of this size; peak memory is roughly one
+# block plus the largest section, however big the file grows
+CROP_CYCLE_BLOCK_SIZE = 64 * 1024
+
+# PDF extraction artefacts in the crop cycle guides
+_PDF_SPACE_GLYPHS = re.compile('[\uf020\u00a0]')
+_PDF_BULLET_GLYPHS = re.compile('[\ue000-\uf8ff]')  # Wingdings/Symbol bullets (private use area)
+_PDF_LEADERS = re.compile(r'-{3,}|_{3,}|\.{4,}|…{2,}')
+_PDF_SPACED_HYPHEN = re.compile(r'(?<=\w)- (?=\w)')
+_PDF_SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+(?=[,.;:!?)])')
+_WHITESPACE = re.compile(r'\s+')
+_TYPOGRAPHIC = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"', '\u2013': '-', '\u2014': '-'
+})
+
+# Structural bytes outside / inside JSON strings
+_JSON_STRUCTURAL = re.compile(rb'["\[\]{},:]')
+_JSON_STRING_SPECIAL = re.compile(rb'["\\]')
+
+
+def normalize_pdf_text(text: str) -> str:
+    """Clean PDF-extracted text: bullet glyphs, leader lines, split hyphens, spacing"""
+    text = _PDF_SPACE_GLYPHS.sub(' ', text)
+    text = _PDF_BULLET_GLYPHS.sub(' • ', text)
+    text = text.translate(_TYPOGRAPHIC)
+    text = _PDF_LEADERS.sub(' ', text)
+    text = _PDF_SPACED_HYPHEN.sub('-', text)
+    text = _PDF_SPACE_BEFORE_PUNCTUATION.sub('', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def iter_crop_cycle_sections(json_file, block_size: int = CROP_CYCLE_BLOCK_SIZE):
+    """Stream the sections of crop_cycle.json without loading the whole file.
+
+    The file is a list of ``{"source_pdf": ..., "sections": [{"title", "content"}]}``
+    objects. Yields one dict per section with its source_pdf, pdf_index,
+    section_index, title, content and the byte range [byte_start, byte_end)
+    of the section object in the file. source_pdf must precede sections in
+    each object (as the extractor writes it).
+    """
+    buffer = bytearray()
+    base = 0                # file offset of buffer[0]
+    pos = 0                 # scan position in buffer
+    stack = []              # open containers
+    in_string = False
+    string_start = None     # buffer index of a key/value string in a PDF object
+    section_start = None    # buffer index of the section object being read
+    expect_key = False
+    last_key = None
+    source_pdf = None
+    pdf_index = -1
+    section_index = 0
+
+    with open(json_file, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            buffer += block
+
+            while True:
+                if in_string:
+                    match = _JSON_STRING_SPECIAL.search(buffer, pos)
+                    if match is None:
+                        pos = len(buffer)
+                        break
+                    if match.group() == b'\\':
+                        if match.end() >= len(buffer):
+                            # Escape split across blocks: rescan after the next read
+                            pos = match.start()
+                            break
+                        pos = match.end() + 1
+                        continue
+                    in_string = False
+                    pos = match.end()
+                    if string_start is not None:
+                        value = json.loads(buffer[string_start:pos])
+                        string_start = None
+                        if expect_key:
+                            last_key = value
+                        elif last_key == "source_pdf":
+                            source_pdf = value
+                    continue
+
+                match = _JSON_STRUCTURAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                char = match.group()
+                pos = match.end()
+
+                if char == b'"':
+                    in_string = True
+                    if len(stack) == 2:
+                        string_start = match.start()
+                elif char in (b'{', b'['):
+                    if char == b'{' and len(stack) == 1:
+                        pdf_index += 1
+                        source_pdf, last_key, section_index = None, None, 0
+                    elif char == b'{' and len(stack) == 3 and last_key == "sections":
+                        section_start = match.start()
+                    stack.append(char)
+                    if len(stack) == 2:
+                        expect_key = True
+                elif char in (b'}', b']'):
+                    stack.pop()
+                    if char == b'}' and len(stack) == 3 and section_start is not None:
+                        section = json.loads(buffer[section_start:pos])
+                        yield {
+                            "source_pdf": source_pdf,
+                            "pdf_index": pdf_index,
+                            "section_index": section_index,
+                            "title": section.get("title", ""),
+                            "content": section.get("content", ""),
+                            "byte_start": base + section_start,
+                            "byte_end": base + pos
+                        }
+                        section_index += 1
+                        section_start = None
+                elif len(stack) == 2:
+                    expect_key = char == b','
+
+            # Drop everything before the earliest byte still needed
+            keep = min(i for i in (pos, string_start, section_start) if i is not None)
+            del buffer[:keep]
+            base += keep
+            pos -= keep
+            if string_start is not None:
+                string_start -= keep
+            if section_start is not None:
+                section_start -= keep
+
+
+class SoilKnowledgeLoader:
+    """Custom loader for soil knowledge base files"""
+
+    def __init__(self, kb_path: str):
+        self.kb_path = Path(kb_path)
+
+    def load_all_documents(self):
+        """Load all documents from the soil knowledge base"""
+        documents = []
+
+        # 1. Load JSON knowledge base
+        json_file = self.kb_path / "complete_soil_knowledge_base.json"
+        if json_file.exists():
+            documents.extend(self._load_json_kb(json_file))
+            logger.info("JSON soil database loaded")
+
+        # 2. Load text documents with error handling
+        docs_folder = self.kb_path / "documents"
+        if docs_folder.exists():
+            documents.extend(self._load_text_documents_safely(docs_folder))
+            logger.info("Text documents loaded")
+
+        # 3. Load CSV data as documents
+        csv_files = ["city_soil_profiles.csv", "regional_soil_statistics.csv"]
+        csv_loaded = 0
+        for csv_file in csv_files:
+            csv_path = self.kb_path / csv_file
+            if csv_path.exists():
+                documents.extend(self._load_csv_data(csv_path))
+                csv_loaded += 1
+
+        if csv_loaded > 0:
+            logger.info("%d CSV files loaded", csv_loaded)
+
+        return documents
+
+    def _load_text_documents_safely(self, docs_folder: Path):
+        """Load text documents with enhanced error handling"""
+        documents = []
+
+        try:
+            txt_files = list(docs_folder.glob("*.txt"))
+
+            for txt_file in txt_files:
+                try:
+                    encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
+
+                    content = None
+                    for encoding in encodings:
+                        try:
+                            with open(txt_file, 'r', encoding=encoding) as f:
+                                content = f.read()
+                            break
+                        except UnicodeDecodeError:
+                            continue
+
+                    if content:
+                        filename = txt_file.stem
+                        doc = Document(
+                            page_content=content,
+                            metadata={
+                                "source": str(txt_file),
+                                "type": "comprehensive_analysis",
+                                "category": "soil_report",
+                                "filename": filename
+                            }
+                        )
+
+                        # Add state/region info based on filename
+                        filename_lower = filename.lower()
+                        if "tamil_nadu" in filename_lower or "chennai" in filename_lower:
+                            doc.metadata["region"] = "tamil_nadu"
+                            doc.metadata["state"] = "Tamil Nadu"
+                        elif "kerala" in filename_lower or "kochi" in filename_lower:
+                            doc.metadata["region"] = "kerala"
+                            doc.metadata["state"] = "Kerala"
+
+                        documents.append(doc)
+                    else:
+                        logger.warning("Could not read %s", txt_file.name)
+
+                except Exception as e:
+                    logger.warning("Error loading %s: %s", txt_file.name, e)
+                    continue
+
+        except Exception as e:
+            logger.error("Error accessing documents folder: %s", e)
+
+        return documents
+
+    def _load_json_kb(self, json_file: Path):
+        """Load JSON knowledge base as per-region/per-depth and guide documents"""
+        documents = []
+
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                kb_data = json.load(f)
+
+            documents.extend(soil_documents(kb_data, str(json_file)))
+
+        except Exception as e:
+            logger.error("Error loading JSON knowledge base: %s", e)
+
+        return documents
+
+    def _load_csv_data(self, csv_file: Path):
+        """Convert CSV data to documents"""
+        documents = []
+
+        try:
+            df = pd.read_csv(csv_file)
+
+            if "city_soil_profiles" in csv_file.name:
+                for _, row in df.iterrows():
+                    content = f"""
+COMPREHENSIVE CITY SOIL PROFILE: {row.get('city', 'N/A')}, {row.get('region', 'N/A')}
+Geographic Location: {row.get('latitude', 'N/A')}°N, {row.get('longitude', 'N/A')}°E
+
+MEASURED SOIL PARAMETERS:
+"""
+                    # Add soil parameters
+                    for col in df.columns:
+                        if col.endswith('_value'):
+                            param = col.replace('_value', '')
+                            value = row.get(col, 'N/A')
+                            content += f"• {param.upper().replace('_', ' ')}: {value}\n"
+
+                    documents.append(Document(
+                        page_content=content,
+                        metadata={
+                            "source": f"csv_city_{row.get('city', 'unknown')}",
+                            "type": "detailed_city_data",
+                            "category": "city_soil_data"
+                        }
+                    ))
+
+        except Exception as e:
+            logger.error("Error loading CSV file %s: %s", csv_file, e)
+
+        return documents
+
+
+class CropCycleKnowledgeLoader:
+    """Custom loader for crop cycle knowledge base"""
+
+    def __init__(self, kb_path: str):
+        self.kb_path = Path(kb_path)
+
+    def load_all_documents(self):
+        """Load all crop cycle documents"""
+        documents = []
+
+        json_file = self.kb_path / "crop_cycle.json"
+        if json_file.exists():
+            documents.extend(self._load_crop_cycle_json(json_file))
+            logger.info("Crop cycle database loaded")
+
+        return documents
+
+    def _load_crop_cycle_json(self, json_file: Path):
+        """Load crop cycle JSON as one document per PDF section"""
+        documents = []
+
+        try:
+            for section in iter_crop_cycle_sections(json_file):
+                title = normalize_pdf_text(section["title"])
+                content = normalize_pdf_text(section["content"])
+                if not content:
+                    continue
+
+                documents.append(Document(
+                    page_content=f"{title}\n{content}" if title and title != "UNLABELED" else content,
+                    metadata={
+                        "source": str(json_file),
+                        "source_pdf": section["source_pdf"],
+                        "section_title": title,
+                        # Byte offsets stay out: chunk ids and the chunk cache hash the metadata,
+                        # and an edit early in the file would shift every later section's offsets
+                        "section_index": section["section_index"],
+                        "type": "crop_production_guide",
+                        "category": "crop_cycle",
+                        "data_format": "json"
+                    }
+                ))
+
+        except Exception as e:
+            logger.error("Error loading crop cycle JSON: %s", e)
+
+        return documents
+
+
+def load_web_documents(urls: list, web_snapshots=None):
+    """Load the farmer scheme pages.
+
+    With a WebSnapshotStore the stored snapshots are served and stale pages
+    are revalidated in the background; otherwise the pages are fetched live.
+    """
+    documents = []
+
+    try:
+        if web_snapshots is not None:
+            web_documents = web_snapshots.documents(urls)
+            web_snapshots.revalidate_in_background(urls)
+        else:
+            web_loader = WebBaseLoader(urls)
+            web_documents = web_loader.load()
+        for doc in web_documents:
+            doc.metadata.update({
+                "category": "farming_schemes",
+                "type": "government_info",
+                "data_format": "web"
+            })
+        documents.extend(web_documents)
+    except Exception as e:
+        logger.warning("Web loading issue: %s", e)
+
+    return documents
+
+
+def load_knowledge_base_documents(soil_kb_path: str = None, crop_cycle_kb_path: str = None, urls: list = None,
+                                  web_snapshots=None):
+    """Load every knowledge base source into one list of documents"""
+    all_documents = []
+
+    # Load soil knowledge base
+    if soil_kb_path:
+        loader = SoilKnowledgeLoader(soil_kb_path)
+        all_documents.extend(loader.load_all_documents())
+
+    # Load crop cycle knowledge base
+    if crop_cycle_kb_path:
+        crop_loader = CropCycleKnowledgeLoader(crop_cycle_kb_path)
+        all_documents.extend(crop_loader.load_all_documents())
+
+    # Load web documents
+    if urls:
+        all_documents.extend(load_web_documents(urls, web_snapshots))
+
+    return all_documents
@@ -0,0 +1,140 @@
+"""
+Persistent exact-match cache of LLM responses.
+
+The RAG prompt is deterministic for a question (fixed template plus the
+retrieved context), so reruns and repeated clicks resend identical prompts.
+``SQLiteResponseCache`` is a langchain ``BaseCache`` given to the chat model
+(``ChatGroq(cache=...)``): responses are stored in SQLite under
+sha256(llm string, rendered prompt) - the llm string holds the model name and
+its parameters - and survive restarts. Every Streamlit process on a host
+shares the file (WAL mode).
+
+When the stored responses exceed ``max_bytes`` the least recently used are
+evicted. Hits and misses are counted per process; each row also counts its
+own hits.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Eviction runs every this many writes instead of after each one
+EVICT_EVERY = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def response_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+class SQLiteResponseCache(BaseCache):
+    """langchain LLM cache in a SQLite file with LRU eviction by size"""
+
+    def __init__(self, path, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(_SCHEMA)
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = response_key(prompt, llm_string)
+        connection = self._connection()
+        row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        generations = None
+        if row is not None:
+            try:
+                generations = loads(row[0])
+            except Exception:
+                # Written by an incompatible langchain version: treat as a miss
+                generations = None
+        with self._lock:
+            if generations is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        connection.execute("UPDATE responses SET used_at = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        connection.commit()
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        response = dumps(return_val)
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+            (response_key(prompt, llm_string), response, len(response.encode('utf-8')), now, now)
+        )
+        connection.commit()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 1
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used responses until the total size fits max_bytes"""
+        connection = self._connection()
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        keys, freed = [], 0
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY used_at"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        connection.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        connection = self._connection()
+        connection.execute("DELETE FROM responses")
+        connection.commit()
+
+    def stats(self) -> dict:
+        entries, size, stored_hits = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+                "stored_hits": stored_hits
+            }
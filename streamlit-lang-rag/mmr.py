@@ -0,0 +1,66 @@
+"""
+Diversity and relevance cutoff for retrieved chunks.
+
+Overlapping chunks of one soil profile or guide section tend to fill every
+slot of the prompt. ``select_diverse`` re-picks the final k from a larger
+candidate list with maximal marginal relevance:
+
+    score(c) = lambda * relevance(c) - (1 - lambda) * max_sim(c, selected)
+
+All candidate-to-candidate similarities come from one matrix product, so
+each greedy step is a vector max instead of a Python loop over pairs.
+``score_threshold`` drops candidates whose cosine similarity to the query is
+below the cutoff first, so weak chunks are left out instead of padding the
+context up to k.
+"""
+import numpy as np
+
+
+def candidate_vectors(vectorstore, positions: list) -> np.ndarray:
+    """Embeddings of the chunks at the given FAISS positions"""
+    partitions = getattr(vectorstore, "partitions", None)
+    if partitions is not None and partitions.vectors is not None and len(partitions.vectors) == vectorstore.index.ntotal:
+        return np.asarray(partitions.vectors[np.asarray(positions, dtype=np.int64)], dtype=np.float32)
+    return np.vstack([vectorstore.index.reconstruct(int(position)) for position in positions]).astype(np.float32)
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> list:
+    """Indices of k rows chosen by maximal marginal relevance, in pick order"""
+    n = len(vectors)
+    similarity = vectors @ vectors.T
+    # Cosine similarity is >= -1, so -1 means "nothing selected yet"
+    redundancy = np.full(n, -1.0, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+    for _ in range(min(k, n)):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def select_diverse(vectorstore, embedding: np.ndarray, candidates: list, k: int, lambda_mult: float = None,
+                   score_threshold: float = None, relevance: list = None) -> list:
+    """Pick up to k of the ranked candidate positions.
+
+    relevance defaults to cosine similarity with the query; hybrid searches
+    pass their fused scores instead, so exact-term hits keep their weight.
+    Without lambda_mult the candidates keep their order.
+    """
+    if not candidates:
+        return []
+    vectors = candidate_vectors(vectorstore, candidates)
+    cosine = vectors @ embedding
+    relevance = cosine if relevance is None else np.asarray(relevance, dtype=np.float32)
+
+    keep = np.arange(len(candidates))
+    if score_threshold is not None:
+        keep = keep[cosine >= score_threshold]
+    if lambda_mult is None:
+        return [candidates[i] for i in keep[:k]]
+
+    scale = relevance[keep].max() if len(keep) else 1.0
+    picked = mmr_select(relevance[keep] / (scale or 1.0), vectors[keep], k, lambda_mult)
+    return [candidates[keep[i]] for i in picked]
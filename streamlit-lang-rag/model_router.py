@@ -0,0 +1,237 @@
+"""
+Per-question choice of the Groq model.
+
+One sidebar model used to serve every question: either the 70B model paid
+its latency on "what is the pH in Kerala?", or the 8B model answered
+multi-part comparisons. ``ModelRouter`` picks the model for each (English)
+question from cheap features:
+
+* length in words and number of question parts
+* intent - comparison, advice/explanation or lookup, from keyword patterns
+* entities - regions/cities (``RegionDetector`` names), soil parameters and crops
+* whether a structured answer exists: the ``SoilTable`` holds the value of
+  the region and parameter asked about
+
+Comparisons, multi-part and entity-heavy questions go to the 70B model,
+advice and long questions to gemma2-9b and lookups (above all those the soil
+table answers) to the 8B model. If the chosen model's expected latency is
+over the per-request budget, the most capable model expected to fit is used
+instead. Expected latencies start from priors and follow the observed
+answer times of each model (exponential moving average). An observation
+fades back toward the prior while the model goes unused, so a latency spike
+cannot keep a model out of the budget for the life of the process.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from partitions import RegionDetector
+from soil_knowledge import DEPTHS
+
+FAST_MODEL = "llama-3.1-8b-instant"
+BALANCED_MODEL = "gemma2-9b-it"
+STRONG_MODEL = "llama-3.3-70b-versatile"
+# Least to most capable
+ROUTED_MODELS = (FAST_MODEL, BALANCED_MODEL, STRONG_MODEL)
+
+# Seconds per answer (retrieval plus the streamed completion) until answers are observed
+DEFAULT_LATENCIES = {FAST_MODEL: 2.0, BALANCED_MODEL: 3.0, STRONG_MODEL: 5.0}
+LATENCY_BUDGET = 8.0
+# Weight of the newest answer time in a model's expected latency
+LATENCY_SMOOTHING = 0.3
+# Seconds for a model's expected latency to get halfway back to its prior without new answers
+LATENCY_RECOVERY_HALF_LIFE = 300.0
+LONG_QUERY_WORDS = 25
+
+logger = logging.getLogger(__name__)
+
+# Query terms naming SoilTable parameters
+PARAMETER_TERMS = {
+    "ph": "phh2o",
+    "acidity": "phh2o",
+    "acidic": "phh2o",
+    "alkaline": "phh2o",
+    "alkalinity": "phh2o",
+    "clay": "clay",
+    "sand": "sand",
+    "sandy": "sand",
+    "silt": "silt",
+    "nitrogen": "nitrogen",
+    "organic carbon density": "ocd",
+    "organic carbon": "soc",
+    "soc": "soc",
+    "cec": "cec",
+    "cation exchange capacity": "cec",
+    "bulk density": "bdod",
+    "coarse fragments": "cfvo"
+}
+
+# Crops of the crop cycle guides and common queries, singular (a plural "s" also matches)
+CROP_TERMS = (
+    "rice", "paddy", "wheat", "maize", "millet", "ragi", "sorghum", "jowar", "bajra", "barley",
+    "sugarcane", "cotton", "jute", "groundnut", "mustard", "soybean", "sunflower", "sesame",
+    "coconut", "arecanut", "rubber", "tea", "coffee", "cardamom", "pepper", "turmeric", "ginger",
+    "banana", "mango", "tapioca", "cassava", "potato", "onion", "tomato", "chilli", "brinjal",
+    "pulse", "gram", "chickpea", "lentil", "pigeon pea", "tur", "moong", "urad", "cashew"
+)
+
+_CROP_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(term) for term in sorted(CROP_TERMS, key=len, reverse=True)) + r")(?:e?s)?\b"
+)
+_PARAMETER_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(term) for term in sorted(PARAMETER_TERMS, key=len, reverse=True)) + r")\b"
+)
+_COMPARISON = re.compile(
+    r"\b(compare[ds]?|comparison|versus|vs|differences?|differ|contrast|which is (?:better|best)|"
+    r"(?:better|worse) than)\b"
+)
+_ADVICE = re.compile(
+    r"\b(how (?:to|do|can|should)|why|explain|plan|schedule|steps?|recommend\w*|suggest\w*|advice|advise|"
+    r"should i|strategy|improve|manage\w*|prevent\w*|eligib\w*|apply for)\b"
+)
+_LOOKUP = re.compile(r"\b(what is|what's|what are|how much|how many|value|level|average|range)\b")
+_EXTRA_PART = re.compile(r";|\balso\b|\bas well as\b|^\s*(?:\d+[.)]|[-*•])\s", re.MULTILINE)
+
+
+class QueryFeatures:
+    """Cheap routing features of a question"""
+
+    def __init__(self, words: int, parts: int, intent: str, regions: list, parameters: list, structured: bool,
+                 crops: list = None):
+        self.words = words
+        self.parts = parts
+        self.intent = intent
+        self.regions = regions
+        self.parameters = parameters
+        self.structured = structured
+        self.crops = crops or []
+
+    @property
+    def entities(self) -> int:
+        return len(self.regions) + len(self.parameters) + len(self.crops)
+
+
+class ModelChoice:
+    """The model for one request and why it was chosen"""
+
+    def __init__(self, model: str, reason: str, expected_latency: float = None):
+        self.model = model
+        self.reason = reason
+        self.expected_latency = expected_latency
+
+
+class ModelRouter:
+    """Routes each question to a Groq model within a latency budget"""
+
+    def __init__(self, soil_table=None, latency_budget: float = LATENCY_BUDGET,
+                 latencies: Optional[Dict[str, float]] = None, recovery_half_life: float = LATENCY_RECOVERY_HALF_LIFE):
+        self.soil_table = soil_table
+        self.regions = RegionDetector(soil_table.regions) if soil_table is not None else None
+        self.latency_budget = latency_budget
+        self.priors = dict(latencies or DEFAULT_LATENCIES)
+        self.latencies = dict(self.priors)
+        self.recovery_half_life = recovery_half_life
+        # When each model's latency was last observed
+        self.observed_at = {}
+        self.routed = {model: 0 for model in ROUTED_MODELS}
+        self._lock = threading.Lock()
+
+    def features(self, query: str) -> QueryFeatures:
+        text = query.lower()
+        regions = []
+        if self.regions is not None and self.regions.pattern is not None:
+            regions = sorted({self.regions.names[name] for name in self.regions.pattern.findall(text)})
+        parameters = sorted({PARAMETER_TERMS[term] for term in _PARAMETER_PATTERN.findall(text)})
+        crops = sorted(set(_CROP_PATTERN.findall(text)))
+
+        if _COMPARISON.search(text) or len(regions) > 1:
+            intent = "comparison"
+        elif _ADVICE.search(text):
+            intent = "advice"
+        elif _LOOKUP.search(text) or parameters:
+            intent = "lookup"
+        else:
+            intent = "general"
+
+        structured = bool(
+            self.soil_table is not None and len(regions) == 1 and parameters
+            and all(self.soil_table.get(regions[0], parameter, DEPTHS[0]) for parameter in parameters)
+        )
+        return QueryFeatures(
+            words=len(text.split()),
+            parts=max(1, text.count("?")) + len(_EXTRA_PART.findall(text)),
+            intent=intent,
+            regions=regions,
+            parameters=parameters,
+            structured=structured,
+            crops=crops
+        )
+
+    def expected_latency(self, model: str, now: float = None) -> float:
+        """Observed latency of model, decayed toward its prior since it was last observed"""
+        with self._lock:
+            observed = self.latencies.get(model, max(self.latencies.values()))
+            prior = self.priors.get(model)
+            observed_at = self.observed_at.get(model)
+            if prior is None or observed_at is None:
+                return observed
+            age = max((now or time.time()) - observed_at, 0.0)
+            return prior + (observed - prior) * 0.5 ** (age / self.recovery_half_life)
+
+    def route(self, query: str) -> ModelChoice:
+        """Model for query, logged with the reason it was chosen"""
+        budget = self.latency_budget
+        features = self.features(query)
+
+        if features.intent == "comparison":
+            model, reason = STRONG_MODEL, "comparison"
+        elif features.parts > 1:
+            model, reason = STRONG_MODEL, f"{features.parts}-part question"
+        elif features.entities >= 3:
+            model, reason = STRONG_MODEL, f"{features.entities} entities"
+        elif features.structured and features.intent in ("lookup", "general"):
+            model, reason = FAST_MODEL, "lookup answered by the soil table"
+        elif features.intent == "advice":
+            model, reason = BALANCED_MODEL, "advice/explanation"
+        elif features.words > LONG_QUERY_WORDS:
+            model, reason = BALANCED_MODEL, f"long question ({features.words} words)"
+        else:
+            model, reason = FAST_MODEL, f"short {features.intent} question"
+
+        expected = self.expected_latency(model)
+        if expected > budget:
+            fitting = [
+                candidate for candidate in ROUTED_MODELS[:ROUTED_MODELS.index(model)]
+                if self.expected_latency(candidate) <= budget
+            ]
+            fallback = fitting[-1] if fitting else min(ROUTED_MODELS, key=self.expected_latency)
+            if fallback != model:
+                reason += f"; {model} expected {expected:.1f}s > {budget:.1f}s budget"
+                model, expected = fallback, self.expected_latency(fallback)
+
+        with self._lock:
+            self.routed[model] = self.routed.get(model, 0) + 1
+        logger.info("Model: %s (%s; expected %.1fs)", model, reason, expected)
+        return ModelChoice(model, reason, expected)
+
+    def record(self, model: str, seconds: float):
+        """Fold an observed answer time of model into its expected latency"""
+        now = time.time()
+        previous = self.expected_latency(model, now) if model in self.latencies else None
+        with self._lock:
+            self.latencies[model] = seconds if previous is None else (
+                (1 - LATENCY_SMOOTHING) * previous + LATENCY_SMOOTHING * seconds
+            )
+            self.observed_at[model] = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = dict(self.routed)
+            models = list(self.latencies)
+        return {
+            "routed": routed,
+            "latencies": {model: self.expected_latency(model) for model in models},
+            "budget": self.latency_budget
+        }
@@ -0,0 +1,113 @@
+"""
+ONNX Runtime embedding backend for the bundled bge-small-en-v1.5 model.
+
+Runs ``onnx/model.onnx`` with the fast ``tokenizer.json`` tokenizer, so
+embedding needs neither torch nor sentence-transformers. Pooling and
+normalisation follow the sentence-transformers config shipped with the model
+(``1_Pooling/config.json`` and ``modules.json``), which keeps the vectors
+interchangeable with the ones produced by ``HuggingFaceEmbeddings``.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from tokenizers import Tokenizer
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings backed by an ONNX Runtime CPU session"""
+
+    def __init__(self, model_path, batch_size: int = 32, intra_op_threads: int = None, max_length: int = None):
+        self.model_path = Path(model_path)
+        self.batch_size = batch_size
+
+        config = self._load_sentence_transformers_config()
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_length = max_length or config["max_seq_length"]
+
+        # Tokenizer: truncate to the model limit, pad each batch to its longest input
+        self.tokenizer = Tokenizer.from_file(str(self.model_path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        pad_token = "[PAD]"
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+
+        # ONNX session: intra-op threads default to ORT's choice (one per physical core)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            str(self.model_path / "onnx" / "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _load_sentence_transformers_config(self) -> dict:
+        """Read pooling mode, normalisation and max length from the model folder"""
+        pooling = "cls"
+        pooling_file = self.model_path / "1_Pooling" / "config.json"
+        if pooling_file.exists():
+            with open(pooling_file, 'r', encoding='utf-8') as f:
+                pooling_config = json.load(f)
+            if pooling_config.get("pooling_mode_mean_tokens"):
+                pooling = "mean"
+
+        normalize = True
+        modules_file = self.model_path / "modules.json"
+        if modules_file.exists():
+            with open(modules_file, 'r', encoding='utf-8') as f:
+                modules = json.load(f)
+            normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+
+        max_seq_length = 512
+        st_config_file = self.model_path / "sentence_bert_config.json"
+        if st_config_file.exists():
+            with open(st_config_file, 'r', encoding='utf-8') as f:
+                max_seq_length = json.load(f).get("max_seq_length", max_seq_length)
+
+        return {"pooling": pooling, "normalize": normalize, "max_seq_length": max_seq_length}
+
+    def _embed_batch(self, texts: list) -> np.ndarray:
+        """Embed one padded batch"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(hidden.dtype)
+            vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        return vectors.astype(np.float32)
+
+    def embed_array(self, texts: list) -> np.ndarray:
+        """Embed texts into a float32 matrix, one batch at a time"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        batches = [
+            self._embed_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.vstack(batches)
+
+    def embed_documents(self, texts: list) -> list:
+        return self.embed_array(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_array([text])[0].tolist()
+
@@ -0,0 +1,164 @@
+"""
+Metadata partitions of a bundle, for filter pushdown.
+
+Every chunk belongs to one partition per field:
+
+* ``region``   - tamil_nadu / kerala, "" for region-neutral chunks
+* ``category`` - soil_report, city_soil_data, crop_cycle, farming_schemes, ...
+* ``type``     - the loader's document type
+* ``source``   - source PDF for crop cycle chunks, file or URL otherwise
+
+``PartitionIndex`` stores the FAISS positions of each partition. A filtered
+query only scores its slice of the index (and its slice of the BM25
+postings) instead of searching the whole index and dropping results
+afterwards, so e.g. Tamil Nadu chunks can no longer crowd Kerala chunks out
+of the top k. The bundle's FAISS index does the scoring through an id
+selector, so quantised and approximate backends serve filtered queries from
+their own compact storage; only the float32 flat index, whose ranking an
+exact scan reproduces, scores the slice of the embedding matrix directly.
+
+Filters map fields to a value or a list of values; values of one field are
+OR-ed, fields are AND-ed::
+
+    {"region": ["kerala", ""], "category": "crop_cycle"}
+"""
+import json
+import re
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from soil_knowledge import region_key
+
+PARTITIONS_FILE = "partitions.json"
+PARTITION_FIELDS = ("region", "category", "type", "source")
+
+
+def partition_values(metadata: dict) -> dict:
+    """The partition of a chunk for every field"""
+    region = metadata.get("region") or metadata.get("state")
+    return {
+        "region": region_key(region) if region else "",
+        "category": metadata.get("category", ""),
+        "type": metadata.get("type", ""),
+        "source": metadata.get("source_pdf") or metadata.get("source", "")
+    }
+
+
+class PartitionIndex:
+    """FAISS positions per partition, plus the embedding matrix to score slices"""
+
+    def __init__(self, positions: dict, vectors: np.ndarray = None):
+        self.positions = positions
+        self.vectors = vectors
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "PartitionIndex":
+        partitions = {field: {} for field in PARTITION_FIELDS}
+        for position in range(vectorstore.index.ntotal):
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            for field, value in partition_values(doc.metadata).items():
+                partitions[field].setdefault(value, []).append(position)
+        return cls({
+            field: {value: np.asarray(members, dtype=np.int64) for value, members in values.items()}
+            for field, values in partitions.items()
+        })
+
+    def save(self, bundle_dir):
+        with open(Path(bundle_dir) / PARTITIONS_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                field: {value: members.tolist() for value, members in values.items()}
+                for field, values in self.positions.items()
+            }, f)
+
+    @classmethod
+    def load(cls, bundle_dir, vectors_file=None, mmap: bool = False):
+        """Load a bundle's partitions, or None if the bundle has none"""
+        partitions_file = Path(bundle_dir) / PARTITIONS_FILE
+        if not partitions_file.exists():
+            return None
+        with open(partitions_file, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        vectors = None
+        if vectors_file is not None and Path(vectors_file).exists():
+            vectors = np.load(vectors_file, mmap_mode='r' if mmap else None)
+        return cls({
+            field: {value: np.asarray(members, dtype=np.int64) for value, members in values.items()}
+            for field, values in stored.items()
+        }, vectors)
+
+    def values(self, field: str) -> list:
+        return sorted(self.positions.get(field, {}))
+
+    def select(self, filter: dict) -> np.ndarray:
+        """Sorted positions of the chunks matching filter"""
+        selected = None
+        for field, wanted in filter.items():
+            if field not in self.positions:
+                raise ValueError(f"Cannot filter on '{field}', expected one of {PARTITION_FIELDS}")
+            if field == "region":
+                wanted = [region_key(value) if value else "" for value in _as_list(wanted)]
+            members = [self.positions[field][value] for value in _as_list(wanted) if value in self.positions[field]]
+            matched = np.unique(np.concatenate(members)) if members else np.zeros(0, dtype=np.int64)
+            selected = matched if selected is None else np.intersect1d(selected, matched, assume_unique=True)
+        return selected
+
+    def search(self, index, embedding: np.ndarray, k: int, positions: np.ndarray) -> list:
+        """Positions of the k nearest chunks among positions, nearest first"""
+        if not len(positions):
+            return []
+        if isinstance(index, faiss.IndexFlat) and self.vectors is not None and len(self.vectors) == index.ntotal:
+            # Exact L2 over the slice, as the flat index ranks it, without scanning the rest
+            distances = ((self.vectors[positions] - embedding) ** 2).sum(axis=1)
+            if len(positions) > k:
+                top = np.argpartition(distances, k - 1)[:k]
+            else:
+                top = np.arange(len(positions))
+            top = top[np.argsort(distances[top], kind="stable")]
+            return [int(p) for p in positions[top]]
+
+        # Let faiss skip everything outside the slice
+        selector = faiss.IDSelectorBatch(positions)
+        if hasattr(index, "hnsw"):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, k))
+        elif hasattr(index, "nprobe"):
+            # A slice holds ~len(positions)/ntotal of each inverted list: probe more lists for small slices
+            nprobe = min(index.nlist, index.nprobe * max(1, index.ntotal // len(positions)))
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        _, found = index.search(embedding[None, :], min(k, len(positions)), params=params)
+        return [int(p) for p in found[0] if p >= 0]
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class RegionDetector:
+    """Infers a region filter from state and city names mentioned in a query"""
+
+    def __init__(self, regions: dict):
+        names = {}
+        for region, info in regions.items():
+            names[region.replace("_", " ")] = region
+            if info.get("name"):
+                names[info["name"].lower()] = region
+            for city in info.get("major_cities", []):
+                names[city["name"].lower()] = region
+        self.names = names
+        alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        self.pattern = re.compile(rf"\b({alternatives})\b") if names else None
+
+    def __call__(self, query: str):
+        """{"region": [region, ""]} when exactly one region is mentioned, else None.
+
+        Region-neutral chunks (crop guides, schemes) stay in scope.
+        """
+        if self.pattern is None:
+            return None
+        mentioned = {self.names[match] for match in self.pattern.findall(query.lower())}
+        if len(mentioned) != 1:
+            return None
+        return {"region": [mentioned.pop(), ""]}
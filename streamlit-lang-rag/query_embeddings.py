@@ -0,0 +1,72 @@
+"""
+Process-wide cache of query embeddings.
+
+Sample-question buttons and popular farmer questions send the same English
+query again and again, and every retrieval embedded it from scratch.
+``CachedQueryEmbeddings`` wraps the embeddings object the index is served
+with: ``embed_query`` results are kept in a bounded LRU keyed by the
+normalised query text, so a repeated question skips model inference.
+``embed_documents`` (index builds) is passed through uncached.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+QUERY_CACHE_SIZE = 1024
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(text: str) -> str:
+    """Cache key of a query: NFKC, case-folded, whitespace collapsed"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings with an LRU cache in front of embed_query"""
+
+    def __init__(self, embeddings: Embeddings, max_size: int = QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+
+        # Inference runs outside the lock; concurrent misses on one key just embed twice
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return vector.tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
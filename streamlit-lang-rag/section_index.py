@@ -0,0 +1,202 @@
+"""
+Two-stage retrieval over the sections of the crop production guides.
+
+crop_cycle.json is organised as PDFs -> titled sections, and the guides make
+up almost all chunks of the knowledge base. ``SectionIndex`` is a coarse index
+with one entry per (source PDF, section):
+
+* the centroid of the section's chunk vectors, and
+* a BM25 index over the section title plus the lead of its first chunk.
+
+``hierarchical_search`` ranks sections with both and with the sections of
+the best chunk-level BM25 hits (reciprocal-rank fusion), keeps the best few,
+and runs the hybrid chunk search only over their chunks plus the chunks that
+belong to no section (soil data, schemes). The fine dense search scans a few hundred chunks however many guides are indexed, and
+results from the same section come back together in reading order.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+from hybrid_search import (
+    DEFAULT_FETCH_K, RRF_K, LexicalIndex, dense_search, documents_at, embed_query, filter_positions, fuse_and_select,
+    hybrid_search, reciprocal_rank_fusion
+)
+
+SECTIONS_DIR = "sections"
+DEFAULT_SECTIONS = 3
+SUMMARY_CHARS = 600
+
+
+def section_settings() -> dict:
+    """Settings recorded in the index manifest"""
+    return {"coarse": "centroid+bm25", "summary_chars": SUMMARY_CHARS}
+
+
+def section_key(metadata: dict):
+    """(source PDF, section index) of a crop guide chunk, None for other chunks"""
+    if metadata.get("source_pdf") is None or metadata.get("section_index") is None:
+        return None
+    return metadata["source_pdf"], int(metadata["section_index"])
+
+
+def section_summary(metadata: dict, lead: str) -> str:
+    """Text the coarse BM25 index sees for a section"""
+    title = metadata.get("section_title")
+    if not title or title == "UNLABELED":
+        title = Path(metadata["source_pdf"]).stem.replace("_", " ").replace("-", " ")
+    return f"{title}\n{lead[:SUMMARY_CHARS]}"
+
+
+class SectionIndex:
+    """Sections of a bundle: their chunk positions (CSR), centroids and summary BM25"""
+
+    def __init__(self, sections: list, indptr: np.ndarray, positions: np.ndarray, centroids: np.ndarray,
+                 lexical: LexicalIndex, ntotal: int):
+        self.sections = sections
+        self.indptr = indptr
+        self.positions = positions
+        self.centroids = centroids
+        self.lexical = lexical
+        # Chunks outside every section are always searched
+        self.loose = np.setdiff1d(np.arange(ntotal, dtype=np.int64), positions, assume_unique=True)
+        # Section id (-1 for loose chunks) and reading order of every position
+        sizes = np.diff(indptr)
+        self.section_ids = np.full(ntotal, -1, dtype=np.int64)
+        self.section_ids[positions] = np.repeat(np.arange(len(sections), dtype=np.int64), sizes)
+        self.reading_order = np.zeros(ntotal, dtype=np.int64)
+        self.reading_order[positions] = np.arange(len(positions)) - np.repeat(indptr[:-1], sizes)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, vectors: np.ndarray = None) -> "SectionIndex":
+        """Group a langchain FAISS store's chunks by section.
+
+        vectors is the embedding matrix in index order; without it the
+        coarse stage is lexical only.
+        """
+        members = {}
+        for position in range(vectorstore.index.ntotal):
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            key = section_key(doc.metadata)
+            if key is not None:
+                members.setdefault(key, []).append((doc.metadata.get("chunk_index", 0), position, doc))
+
+        sections, summaries, indptr, positions = [], [], [0], []
+        for key in sorted(members):
+            chunks = sorted(members[key], key=lambda member: member[:2])
+            first = chunks[0][2]
+            sections.append({"source_pdf": key[0], "section_index": key[1],
+                             "title": first.metadata.get("section_title", "")})
+            summaries.append(section_summary(first.metadata, first.page_content))
+            positions.extend(position for _, position, _ in chunks)
+            indptr.append(len(positions))
+
+        indptr = np.asarray(indptr, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        centroids = None
+        if vectors is not None and len(vectors) == vectorstore.index.ntotal and len(sections):
+            centroids = np.add.reduceat(vectors[positions], indptr[:-1], axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            centroids = centroids.astype(np.float32)
+        return cls(sections, indptr, positions, centroids, LexicalIndex.build(summaries), vectorstore.index.ntotal)
+
+    def save(self, bundle_dir):
+        sections_dir = Path(bundle_dir) / SECTIONS_DIR
+        sections_dir.mkdir(parents=True, exist_ok=True)
+        np.save(sections_dir / "indptr.npy", self.indptr)
+        np.save(sections_dir / "positions.npy", self.positions)
+        if self.centroids is not None:
+            np.save(sections_dir / "centroids.npy", self.centroids)
+        self.lexical.save(sections_dir)
+        with open(sections_dir / "sections.json", 'w', encoding='utf-8') as f:
+            json.dump({"ntotal": len(self.loose) + len(self.positions), "sections": self.sections}, f)
+
+    @classmethod
+    def load(cls, bundle_dir, mmap: bool = False):
+        """Load a bundle's section index, or None if the bundle has none"""
+        sections_dir = Path(bundle_dir) / SECTIONS_DIR
+        if not (sections_dir / "sections.json").exists():
+            return None
+        mmap_mode = 'r' if mmap else None
+        with open(sections_dir / "sections.json", 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        centroids_file = sections_dir / "centroids.npy"
+        return cls(
+            stored["sections"],
+            np.load(sections_dir / "indptr.npy"),
+            np.load(sections_dir / "positions.npy"),
+            np.load(centroids_file, mmap_mode=mmap_mode) if centroids_file.exists() else None,
+            LexicalIndex.load(sections_dir, mmap=mmap),
+            stored["ntotal"]
+        )
+
+    def rank(self, query: str, embedding: np.ndarray, n: int, fetch_k: int = DEFAULT_FETCH_K,
+             chunk_hits: list = None) -> list:
+        """Ids of the n sections best matching the query.
+
+        chunk_hits (ranked chunk positions, e.g. from the chunk BM25 index)
+        add the sections holding them as a third ranking, so exact terms
+        deep inside a section still select it.
+        """
+        rankings = []
+        if self.centroids is not None and len(self.centroids):
+            scores = self.centroids @ embedding
+            top = np.argpartition(-scores, min(fetch_k, len(scores)) - 1)[:fetch_k]
+            rankings.append([int(i) for i in top[np.argsort(-scores[top], kind="stable")]])
+        rankings.append([i for i, _ in self.lexical.search(query, fetch_k)])
+        if chunk_hits:
+            sections = [int(self.section_ids[position]) for position in chunk_hits]
+            rankings.append(list(dict.fromkeys(section for section in sections if section >= 0)))
+        return reciprocal_rank_fusion(rankings)[:n]
+
+    def chunk_positions(self, section_ids: list) -> np.ndarray:
+        """Sorted positions of the chunks of the given sections and of all loose chunks"""
+        parts = [self.positions[self.indptr[i]:self.indptr[i + 1]] for i in section_ids]
+        return np.unique(np.concatenate(parts + [self.loose]))
+
+    def group_by_section(self, hits: list) -> list:
+        """Reorder ranked positions so each section's hits are adjacent and in reading order.
+
+        Groups keep the rank of their best hit; loose chunks stand alone.
+        """
+        def group(position):
+            section_id = int(self.section_ids[position])
+            return section_id if section_id >= 0 else ("loose", position)
+
+        group_rank = {}
+        for rank, position in enumerate(hits):
+            group_rank.setdefault(group(position), rank)
+        return sorted(hits, key=lambda position: (group_rank[group(position)], int(self.reading_order[position])))
+
+
+def hierarchical_search(vectorstore, query: str, k: int = 4, sections: int = DEFAULT_SECTIONS,
+                        fetch_k: int = DEFAULT_FETCH_K, rrf_k: int = RRF_K, filter: dict = None,
+                        lambda_mult: float = None, score_threshold: float = None) -> list:
+    """Top-k documents from the best sections (see module docstring).
+
+    lambda_mult and score_threshold work as in hybrid_search. Chunks of one
+    section are returned next to each other in reading order, sections
+    ordered by their best chunk. Falls back to hybrid_search for bundles
+    without a section index.
+    """
+    section_index = getattr(vectorstore, "sections", None)
+    if section_index is None or vectorstore.partitions is None:
+        return hybrid_search(vectorstore, query, k=k, fetch_k=fetch_k, rrf_k=rrf_k, filter=filter,
+                             lambda_mult=lambda_mult, score_threshold=score_threshold)
+
+    embedding = embed_query(vectorstore, query)
+    allowed = filter_positions(vectorstore, filter)
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    lexical_hits = [position for position, _ in lexical_index.search(query, fetch_k, allowed)] if lexical_index else []
+
+    selected = section_index.rank(query, embedding, sections, fetch_k, lexical_hits)
+    positions = section_index.chunk_positions(selected)
+    if allowed is not None:
+        positions = np.intersect1d(positions, allowed, assume_unique=True)
+
+    rankings = [dense_search(vectorstore, query, fetch_k, positions, embedding=embedding)]
+    if lexical_index is not None:
+        rankings.append([position for position, _ in lexical_index.search(query, fetch_k, positions)])
+    hits = fuse_and_select(vectorstore, embedding, rankings, k, rrf_k, lambda_mult, score_threshold)
+    return documents_at(vectorstore, section_index.group_by_section(hits))
@@ -0,0 +1,248 @@
+"""
+Structured view of complete_soil_knowledge_base.json.
+
+``SoilTable`` holds every statistic of the SoilGrids extract keyed by
+(region, parameter, depth), so a value is a dict lookup instead of a walk
+over the nested JSON. ``soil_documents`` renders the same data as compact
+retrieval documents: one per region and depth layer, one overview per
+region and one per agricultural interpretation guide entry.
+
+SoilGrids publishes integer "mapped units" (pH x 10, clay in g/kg, ...);
+values are converted to the conventional units listed in
+``parameter_definitions`` when the table is built.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from langchain.schema import Document
+
+# Divide SoilGrids mapped values by these to get the parameter_definitions units
+SOILGRIDS_CONVERSION = {
+    "bdod": 100,      # cg/cm3 -> kg/dm3
+    "cec": 10,        # mmol(c)/kg -> cmol(c)/kg
+    "cfvo": 10,       # cm3/dm3 -> vol%
+    "clay": 10,       # g/kg -> %
+    "sand": 10,
+    "silt": 10,
+    "nitrogen": 100,  # cg/kg -> g/kg
+    "phh2o": 10,      # pH x 10 -> pH
+    "soc": 10,        # dg/kg -> g/kg
+    "ocd": 10         # hg/m3 -> kg/m3
+}
+
+DEPTHS = ("0-5cm", "5-15cm", "15-30cm", "30-60cm", "60-100cm", "100-200cm")
+
+_STATISTIC_FIELDS = ("mean", "median", "std", "min", "max", "q25", "q75")
+
+
+class SoilStatistic(NamedTuple):
+    """Summary of one soil parameter over one region and depth layer"""
+    region: str
+    parameter: str
+    depth: str
+    name: str
+    unit: str
+    mean: float
+    median: float
+    std: float
+    min: float
+    max: float
+    q25: float
+    q75: float
+    count: int
+
+
+def region_key(region: str) -> str:
+    """'Tamil Nadu' / 'tamil-nadu' -> 'tamil_nadu'"""
+    return region.strip().lower().replace("-", " ").replace(" ", "_")
+
+
+def ph_class(ph: float) -> str:
+    """pH_guide class of a pH value"""
+    if ph < 5.0:
+        return "strongly_acidic"
+    if ph < 6.0:
+        return "moderately_acidic"
+    if ph < 7.0:
+        return "slightly_acidic"
+    if ph <= 7.5:
+        return "neutral"
+    return "alkaline"
+
+
+def texture_class(clay_percent: float, sand_percent: float) -> str:
+    """texture_guide class from clay and sand percentages"""
+    if clay_percent > 40:
+        return "clay_soils"
+    if sand_percent > 70:
+        return "sandy_soils"
+    return "loamy_soils"
+
+
+def organic_matter_class(soc_g_per_kg: float) -> str:
+    """organic_matter_guide class of a soil organic carbon value"""
+    soc_percent = soc_g_per_kg / 10
+    if soc_percent < 0.5:
+        return "very_low"
+    if soc_percent < 1.0:
+        return "low"
+    if soc_percent <= 2.0:
+        return "adequate"
+    return "high"
+
+
+class SoilTable:
+    """Soil statistics keyed by (region, parameter, depth)"""
+
+    def __init__(self, rows: List[SoilStatistic], regions: Dict[str, dict] = None):
+        self._rows = {(row.region, row.parameter, row.depth): row for row in rows}
+        self.regions = regions or {}
+        self.parameters = sorted({row.parameter for row in rows})
+
+    @classmethod
+    def from_knowledge_base(cls, kb_data: dict) -> "SoilTable":
+        definitions = kb_data.get("parameter_definitions", {})
+        rows = []
+        for region, region_data in kb_data.get("regions", {}).items():
+            for parameter, depths in region_data.get("soil_parameters", {}).items():
+                scale = SOILGRIDS_CONVERSION.get(parameter, 1)
+                definition = definitions.get(parameter, {})
+                for depth, layer in depths.items():
+                    stats = layer.get("statistics") or {}
+                    if not stats.get("count"):
+                        continue
+                    rows.append(SoilStatistic(
+                        region=region,
+                        parameter=parameter,
+                        depth=depth,
+                        name=definition.get("name", parameter),
+                        unit=definition.get("unit", ""),
+                        count=int(stats["count"]),
+                        **{field: float(stats[field]) / scale for field in _STATISTIC_FIELDS}
+                    ))
+        regions = {
+            region: region_data.get("region_info", {})
+            for region, region_data in kb_data.get("regions", {}).items()
+        }
+        return cls(rows, regions)
+
+    @classmethod
+    def from_json(cls, json_file) -> "SoilTable":
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return cls.from_knowledge_base(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, region: str, parameter: str, depth: str) -> Optional[SoilStatistic]:
+        return self._rows.get((region_key(region), parameter, depth))
+
+    def value(self, region: str, parameter: str, depth: str = DEPTHS[0], statistic: str = "mean") -> Optional[float]:
+        """One statistic in conventional units, or None if not measured"""
+        row = self.get(region, parameter, depth)
+        return getattr(row, statistic) if row else None
+
+    def profile(self, region: str, parameter: str) -> List[SoilStatistic]:
+        """A parameter down the soil profile, top layer first"""
+        return [row for row in (self.get(region, parameter, depth) for depth in DEPTHS) if row]
+
+    def layer(self, region: str, depth: str) -> List[SoilStatistic]:
+        """All parameters measured in one depth layer"""
+        return [row for row in (self.get(region, parameter, depth) for parameter in self.parameters) if row]
+
+
+def _format_statistic(row: SoilStatistic) -> str:
+    return (
+        f"• {row.name}: mean {row.mean:.2f} {row.unit} "
+        f"(median {row.median:.2f}, IQR {row.q25:.2f}-{row.q75:.2f}, range {row.min:.2f}-{row.max:.2f})"
+    )
+
+
+def _layer_interpretation(rows: Dict[str, SoilStatistic]) -> List[str]:
+    lines = []
+    if "phh2o" in rows:
+        lines.append(f"pH class: {ph_class(rows['phh2o'].mean).replace('_', ' ')}")
+    if "clay" in rows and "sand" in rows:
+        lines.append(f"Texture class: {texture_class(rows['clay'].mean, rows['sand'].mean).replace('_', ' ')}")
+    if "soc" in rows:
+        lines.append(f"Organic matter: {organic_matter_class(rows['soc'].mean).replace('_', ' ')}")
+    return lines
+
+
+def _format_guide_value(value) -> str:
+    return ", ".join(value) if isinstance(value, list) else str(value)
+
+
+def soil_documents(kb_data: dict, source: str, table: SoilTable = None) -> list:
+    """Retrieval documents for the soil JSON knowledge base"""
+    table = table or SoilTable.from_knowledge_base(kb_data)
+    documents = []
+
+    for region, info in table.regions.items():
+        state = info.get("name", region.replace("_", " ").title())
+        base_metadata = {
+            "source": source,
+            "category": "soil_data",
+            "data_format": "json",
+            "region": region,
+            "state": state
+        }
+
+        cities = ", ".join(city["name"] for city in info.get("major_cities", []))
+        bounds = info.get("bounds", {})
+        overview = [f"SOIL OVERVIEW: {state}"]
+        if bounds:
+            overview.append(
+                f"Area: {bounds.get('south')}-{bounds.get('north')}°N, {bounds.get('west')}-{bounds.get('east')}°E"
+            )
+        if cities:
+            overview.append(f"Major cities: {cities}")
+        overview.append("Topsoil (0-5cm) summary:")
+        overview.extend(_format_statistic(row) for row in table.layer(region, DEPTHS[0]))
+        documents.append(Document(
+            page_content="\n".join(overview),
+            metadata={**base_metadata, "type": "regional_overview"}
+        ))
+
+        for depth in DEPTHS:
+            rows = table.layer(region, depth)
+            if not rows:
+                continue
+            lines = [f"SOIL PROFILE: {state}, depth {depth}"]
+            lines.extend(_format_statistic(row) for row in rows)
+            lines.extend(_layer_interpretation({row.parameter: row for row in rows}))
+            documents.append(Document(
+                page_content="\n".join(lines),
+                metadata={**base_metadata, "type": "depth_statistics", "depth": depth}
+            ))
+
+    for guide, entries in kb_data.get("agricultural_interpretations", {}).items():
+        guide_name = guide.replace("_", " ")
+        for entry, details in entries.items():
+            lines = [f"{guide_name.upper()}: {entry.replace('_', ' ')}"]
+            lines.extend(f"{field.replace('_', ' ').capitalize()}: {_format_guide_value(value)}"
+                         for field, value in details.items())
+            documents.append(Document(
+                page_content="\n".join(lines),
+                metadata={
+                    "source": source,
+                    "type": "interpretation_guide",
+                    "category": "soil_management",
+                    "data_format": "json",
+                    "guide": guide,
+                    "guide_entry": entry
+                }
+            ))
+
+    return documents
+
+
+def load_soil_table(soil_kb_path) -> Optional[SoilTable]:
+    """SoilTable for a soil knowledge base folder, or None if it has no JSON"""
+    if not soil_kb_path:
+        return None
+    json_file = Path(soil_kb_path) / "complete_soil_knowledge_base.json"
+    if not json_file.exists():
+        return None
+    return SoilTable.from_json(json_file)
@@ -0,0 +1,166 @@
+"""
+Sentence-level answer -> translation -> speech pipeline.
+
+The voice paths used to wait for the whole LLM answer, translate all of it
+and only then synthesise all of it, so a farmer heard nothing until the sum
+of the three stages had passed. ``SpeechPipeline`` is fed the answer as it
+streams: every completed segment (one or more whole sentences) is handed to
+a small thread pool that translates it and synthesises its audio while the
+LLM is still writing the next ones. ``finish`` yields the segments in answer
+order as they complete, so the first one can be played straight away and
+total latency approaches that of the slowest stage.
+
+The first segment is a single sentence, to get audio out early; later ones
+group sentences up to ``SEGMENT_CHARS`` to keep the number of API calls
+down. Like ``text_to_speech``, audio is limited to the start of the answer
+(``AUDIO_CHAR_LIMIT`` English characters); the rest is still translated.
+"""
+import concurrent.futures
+import logging
+import re
+import time
+from typing import Callable, Iterator
+
+AUDIO_CHAR_LIMIT = 2000
+SEGMENT_CHARS = 300
+# Below the translate (1000) and single-request TTS (700) limits
+MAX_SEGMENT_CHARS = 700
+PIPELINE_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+# End of a sentence (also the Devanagari danda) or of a line/list item
+_BOUNDARY = re.compile(r'[.!?।]+["\')\]*]*\s+|\n+')
+
+
+class SpeechSegment:
+    """A piece of the answer with its translation and audio"""
+
+    def __init__(self, text: str, separator: str, start: int):
+        self.text = text
+        self.separator = separator
+        self.start = start
+        self.translated = text
+        self.translated_ok = True
+        self.audio = None
+
+
+class SentenceSegmenter:
+    """Cuts a growing answer into segments that end at sentence boundaries"""
+
+    def __init__(self, first_chars: int = 1, segment_chars: int = SEGMENT_CHARS,
+                 max_chars: int = MAX_SEGMENT_CHARS):
+        self.first_chars = first_chars
+        self.segment_chars = segment_chars
+        self.max_chars = max_chars
+        self.offset = 0
+        self.count = 0
+
+    def _cut(self, pending: str, target: int):
+        end = None
+        for match in _BOUNDARY.finditer(pending):
+            if match.end() > self.max_chars:
+                break
+            end = match.end()
+            if end >= target:
+                return end
+        if len(pending) > self.max_chars:
+            # No boundary in reach: cut at the last boundary or space before the limit
+            return end or pending.rfind(" ", 0, self.max_chars) + 1 or self.max_chars
+        return None
+
+    def _segment(self, raw: str):
+        start = self.offset
+        self.offset += len(raw)
+        text = raw.strip()
+        if not text:
+            return None
+        self.count += 1
+        return SpeechSegment(text, "\n" if "\n" in raw[len(raw.rstrip()):] else " ", start)
+
+    def feed(self, text: str) -> list:
+        """New complete segments of text, the answer so far"""
+        segments = []
+        while True:
+            pending = text[self.offset:]
+            cut = self._cut(pending, self.segment_chars if self.count else self.first_chars)
+            if cut is None:
+                return segments
+            segment = self._segment(pending[:cut])
+            if segment is not None:
+                segments.append(segment)
+
+    def flush(self, text: str) -> list:
+        """Remaining segments of the complete answer"""
+        segments = self.feed(text)
+        segment = self._segment(text[self.offset:])
+        if segment is not None:
+            segments.append(segment)
+        return segments
+
+
+class SpeechPipeline:
+    """Translates and synthesises answer segments concurrently as the answer streams in.
+
+    translate(text) -> (text, ok) and synthesize(text) -> (audio, ok) run on
+    pool threads, so they must not touch Streamlit elements.
+    """
+
+    def __init__(self, translate: Callable, synthesize: Callable, workers: int = PIPELINE_WORKERS,
+                 audio_chars: int = AUDIO_CHAR_LIMIT):
+        self.translate = translate
+        self.synthesize = synthesize
+        self.audio_chars = audio_chars
+        self.segmenter = SentenceSegmenter()
+        self.started = time.time()
+        self.first_audio_at = None
+        self._futures = []
+        self._first_taken = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speech")
+
+    def _process(self, segment: SpeechSegment) -> SpeechSegment:
+        translated, ok = self.translate(segment.text)
+        if ok and translated.strip():
+            segment.translated = translated.strip()
+        else:
+            segment.translated_ok = False
+        if segment.start < self.audio_chars:
+            audio, audio_ok = self.synthesize(segment.translated)
+            if audio_ok and audio:
+                segment.audio = audio
+                if segment.start == 0:
+                    self.first_audio_at = time.time()
+        return segment
+
+    def _submit(self, segments: list):
+        for segment in segments:
+            self._futures.append(self._executor.submit(self._process, segment))
+
+    def feed(self, text: str):
+        """Queue the segments completed in text, the answer so far"""
+        self._submit(self.segmenter.feed(text))
+
+    def take_first_audio(self):
+        """Audio of the first segment, returned once when it is ready (None before and after)"""
+        if self._first_taken or not self._futures or not self._futures[0].done():
+            return None
+        self._first_taken = True
+        return self._futures[0].result().audio
+
+    def finish(self, text: str) -> Iterator[SpeechSegment]:
+        """Queue the rest of the complete answer and yield every segment in order as it completes"""
+        self._submit(self.segmenter.flush(text))
+        try:
+            for future in self._futures:
+                yield future.result()
+        finally:
+            self._executor.shutdown(wait=False)
+            first = f"{self.first_audio_at - self.started:.2f}s" if self.first_audio_at else "none"
+            logger.info(
+                "Speech: %d segments in %.2fs, first audio after %s",
+                len(self._futures), time.time() - self.started, first
+            )
+
+
+def joined_translation(segments: list) -> str:
+    return "".join(segment.translated + segment.separator for segment in segments).strip()
@@ -0,0 +1,126 @@
+"""
+Disk-backed docstore for served index bundles.
+
+``FAISS.save_local`` pickles every chunk into ``index.pkl``, so each serving
+process held the whole corpus text in memory next to the vectors. Bundles now
+also carry ``docstore.sqlite`` with the chunk text and metadata keyed by
+FAISS position, plus an FTS5 table over the text. A served vector store keeps
+only the position -> chunk id map in memory; a ``Document`` is read from disk
+when a search asks for it, i.e. only for the top-k hits that go into the
+prompt.
+
+The database is written once per bundle and opened read-only when the bundle
+is loaded. That one connection is shared by every thread (Streamlit sessions
+and the index refresher query it concurrently) under a lock; opening it
+eagerly keeps the file readable after ``publish_version`` deletes the bundle
+directory of a version still being served.
+
+Keyword retrieval normally uses the bundle's BM25 postings (``LexicalIndex``),
+which score partition slices without SQL. ``FullTextIndex`` serves the FTS5
+table in the same shape for bundles that have no postings.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from langchain.schema import Document
+from langchain_community.docstore.base import Docstore
+
+from hybrid_search import tokenize
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+_SCHEMA = """
+CREATE TABLE chunks (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+)
+"""
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE chunks_fts USING fts5(text, content='chunks', content_rowid='position')"
+
+
+def write_docstore(vectorstore, bundle_dir) -> Path:
+    """Write the chunks of a langchain FAISS store to bundle_dir in index order"""
+    path = Path(bundle_dir) / DOCSTORE_FILE
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(_SCHEMA)
+        rows = []
+        for position in range(vectorstore.index.ntotal):
+            cid = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(cid)
+            rows.append((position, cid, doc.page_content, json.dumps(doc.metadata, default=str)))
+        connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        try:
+            connection.execute(_FTS_SCHEMA)
+            connection.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: the bundle still serves documents
+            pass
+        connection.commit()
+    finally:
+        connection.close()
+    return path
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only langchain docstore over a bundle's docstore.sqlite"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._connection = sqlite3.connect(
+            f"{self.path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self.has_fts = bool(self._fetch("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"))
+
+    @classmethod
+    def load(cls, bundle_dir):
+        """Open a bundle's docstore, or None if the bundle has none"""
+        path = Path(bundle_dir) / DOCSTORE_FILE
+        return cls(path) if path.exists() else None
+
+    def _fetch(self, sql: str, parameters=()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def index_to_docstore_id(self) -> dict:
+        """FAISS position -> chunk id, the only per-chunk state kept in memory"""
+        return dict(self._fetch("SELECT position, id FROM chunks ORDER BY position"))
+
+    def search(self, search: str):
+        """The Document stored under a chunk id"""
+        rows = self._fetch("SELECT text, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        return Document(page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def full_text_search(self, query: str, k: int, positions=None) -> list:
+        """Top-k (position, score) pairs from the FTS5 table, best first, optionally only among positions"""
+        terms = sorted(set(tokenize(query)))
+        if not self.has_fts or not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        # FTS5 bm25() is negative, lower is better
+        rows = self._fetch(
+            "SELECT rowid, -bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts)"
+            + ("" if positions is not None else " LIMIT ?"),
+            (match,) if positions is not None else (match, k)
+        )
+        if positions is not None:
+            allowed = set(positions.tolist())
+            rows = [row for row in rows if row[0] in allowed][:k]
+        return [(int(position), float(score)) for position, score in rows]
+
+
+class FullTextIndex:
+    """A docstore's FTS5 table behind the LexicalIndex search interface"""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def search(self, query: str, k: int, positions=None) -> list:
+        return self.docstore.full_text_search(query, k, positions)
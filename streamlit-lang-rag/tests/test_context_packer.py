@@ -0,0 +1,49 @@
+from langchain.schema import Document
+
+from build_index import CHUNK_SEPARATORS, DEFAULT_MODEL_PATH
+from context_packer import ContextPacker, join_overlapping
+from token_chunker import TokenChunker
+
+SOURCE = (
+    "Rice Production Guide\n\n"
+    + "".join(
+        f"Plot {plot}: transplant seedlings at {20 + plot} days. Apply {100 + 5 * plot} kg N/ha in three splits. "
+        f"No. of weeks to harvest: {plot + 12}. Drain the field ten days before harvest.\n"
+        for plot in range(12)
+    )
+    + "\n"
+    + "Table 3. Western Zone 35-50 16 3. Eastern Zone 40-60 18 4.\n\n"
+    + "-".join(f"NPK{grade}" for grade in range(300)) + "\n\n"
+    + " ".join(f"Organic matter improves soil structure in block {block}." for block in range(30))
+)
+
+
+def test_chunks_rejoin_into_their_source():
+    chunker = TokenChunker(DEFAULT_MODEL_PATH, 64, 16, CHUNK_SEPARATORS, max_tokens=96)
+    chunks = chunker.split_text(SOURCE)
+    assert len(chunks) > 10
+
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        text = join_overlapping(text, chunk)
+    assert text == SOURCE
+
+
+def test_join_without_overlap():
+    assert join_overlapping("grain yield", ". Importance of") == "grain yield. Importance of"
+    assert join_overlapping("root growth", "\n\nCation Exchange") == "root growth\n\nCation Exchange"
+    # Chunks stripped of their separator
+    assert join_overlapping("soil", "structure") == "soil structure"
+
+
+def test_merge_removes_overlap_between_neighbouring_chunks():
+    metadata = {"source": "guide.pdf"}
+    chunks = [
+        Document(page_content="Apply 120 kg N/ha in three splits.", metadata=dict(metadata, chunk_index=0)),
+        Document(page_content=" in three splits. Drain the field.", metadata=dict(metadata, chunk_index=1))
+    ]
+
+    [passage] = ContextPacker().merge(chunks)
+
+    assert passage.page_content == "Apply 120 kg N/ha in three splits. Drain the field."
+    assert passage.metadata["merged_chunks"] == 2
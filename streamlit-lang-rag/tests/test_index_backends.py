@@ -0,0 +1,159 @@
+import shutil
+
+import faiss
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+from hybrid_search import LEXICAL_DIR
+from knowledge_index import (
+    ChunkEmbeddingStore, build_manifest, current_version, load_index, load_index_for_update, save_index, sync_index,
+    text_key
+)
+from sqlite_docstore import FullTextIndex
+
+DIM = 384
+N_CHUNKS = 1200
+
+
+class TableEmbeddings(Embeddings):
+    """Fixed vectors per text, so searches have known answers"""
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text].tolist()
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((N_CHUNKS, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docs = [
+        Document(page_content=f"chunk {i}", metadata={"n": i, "region": "kerala" if i % 3 else "tamil_nadu"})
+        for i in range(N_CHUNKS)
+    ]
+    return docs, TableEmbeddings({doc.page_content: vector for doc, vector in zip(docs, vectors)})
+
+
+def build_bundle(tmp_path, docs, embeddings, index_settings):
+    manifest = build_manifest({}, {}, tmp_path / "model", index_settings=index_settings)
+    store = ChunkEmbeddingStore(tmp_path / "cache", manifest)
+    for doc in docs:
+        store.put(text_key(doc.page_content), embeddings.vectors[doc.page_content])
+    vectorstore, stats = sync_index(docs, embeddings, store, index_settings=index_settings)
+    save_index(vectorstore, tmp_path / "index", manifest, store)
+    return manifest, store, stats
+
+
+def update(tmp_path, docs, embeddings, manifest, store):
+    """The build_index.py update path: patch the live bundle when possible, else rebuild"""
+    previous = load_index_for_update(tmp_path / "index", embeddings, manifest)
+    vectorstore, _ = sync_index(docs, embeddings, store, previous, index_settings=manifest["index"])
+    return previous, vectorstore
+
+
+def assert_results_map_to_documents(vectorstore, docs, embeddings):
+    for doc in docs[::97]:
+        found = vectorstore.similarity_search_by_vector(embeddings.vectors[doc.page_content], k=4)
+        assert doc.metadata["n"] in [result.metadata["n"] for result in found]
+        assert found[0].page_content == f"chunk {found[0].metadata['n']}"
+
+
+def test_ivfpq_bundle_is_rebuilt_after_deletes(tmp_path, corpus):
+    docs, embeddings = corpus
+    manifest, store, stats = build_bundle(tmp_path, docs, embeddings, {"kind": "ivfpq", "storage": "float32"})
+    assert stats["index"]["kind"] == "ivfpq"
+
+    kept = docs[100:]
+    previous, vectorstore = update(tmp_path, kept, embeddings, manifest, store)
+
+    assert previous is None
+    assert vectorstore.index.ntotal == len(kept)
+    assert_results_map_to_documents(vectorstore, kept, embeddings)
+
+
+def test_sq8_bundle_is_patched_after_deletes(tmp_path, corpus):
+    docs, embeddings = corpus
+    manifest, store, _ = build_bundle(tmp_path, docs, embeddings, {"kind": "flat", "storage": "int8"})
+
+    kept = docs[100:]
+    previous, vectorstore = update(tmp_path, kept, embeddings, manifest, store)
+
+    assert previous is not None
+    assert vectorstore.index.ntotal == len(kept)
+    assert_results_map_to_documents(vectorstore, kept, embeddings)
+
+
+@pytest.mark.parametrize("index_settings", [
+    {"kind": "ivfpq", "storage": "float32"},
+    {"kind": "flat", "storage": "int8"},
+    {"kind": "hnsw", "storage": "float32"}
+])
+def test_bundle_loads_memory_mapped(tmp_path, corpus, index_settings):
+    docs, embeddings = corpus
+    manifest, _, _ = build_bundle(tmp_path, docs, embeddings, index_settings)
+
+    vectorstore = load_index(tmp_path / "index", embeddings, manifest, mmap=True)
+
+    assert vectorstore is not None
+    assert_results_map_to_documents(vectorstore, docs, embeddings)
+
+
+class UnreadableMatrix:
+    """Embedding matrix stand-in that fails the test if a search reads it"""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, item):
+        raise AssertionError("filtered search scanned vectors.npy")
+
+
+@pytest.mark.parametrize("index_settings", [
+    {"kind": "flat", "storage": "float32"},
+    {"kind": "ivfpq", "storage": "float32"},
+    {"kind": "flat", "storage": "int8"},
+    {"kind": "hnsw", "storage": "float32"}
+])
+def test_filtered_search_uses_the_bundle_index(tmp_path, corpus, index_settings):
+    docs, embeddings = corpus
+    manifest, _, _ = build_bundle(tmp_path, docs, embeddings, index_settings)
+    vectorstore = load_index(tmp_path / "index", embeddings, manifest, mmap=True)
+    partitions = vectorstore.partitions
+    if not isinstance(vectorstore.index, faiss.IndexFlat):
+        partitions.vectors = UnreadableMatrix(vectorstore.index.ntotal)
+
+    positions = partitions.select({"region": "tamil_nadu"})
+    for doc in docs[::97]:
+        found = partitions.search(vectorstore.index, np.asarray(embeddings.vectors[doc.page_content]), 4, positions)
+        assert len(found) == 4
+        assert set(found) <= set(positions.tolist())
+        if doc.metadata["region"] == "tamil_nadu":
+            ns = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[p]).metadata["n"] for p in found]
+            assert doc.metadata["n"] in ns
+
+
+def test_bundle_without_bm25_postings_searches_fts5(tmp_path, corpus):
+    docs, embeddings = corpus
+    manifest, _, _ = build_bundle(tmp_path, docs, embeddings, {"kind": "flat", "storage": "float32"})
+    version_dir = current_version(tmp_path / "index")
+    shutil.rmtree(version_dir / LEXICAL_DIR)
+
+    vectorstore = load_index(tmp_path / "index", embeddings, manifest, mmap=True)
+
+    assert isinstance(vectorstore.lexical_index, FullTextIndex)
+    [(position, _)] = vectorstore.lexical_index.search("517", 4)
+    assert vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]).page_content == "chunk 517"
+    tamil_nadu = vectorstore.partitions.select({"region": "tamil_nadu"})
+    assert vectorstore.lexical_index.search("517", 4, tamil_nadu) == []
+    assert [position for position, _ in vectorstore.lexical_index.search("chunk 516", 4, tamil_nadu)][0] == 516
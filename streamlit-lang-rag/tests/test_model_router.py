@@ -0,0 +1,29 @@
+from unittest import mock
+
+from model_router import DEFAULT_LATENCIES, FAST_MODEL, STRONG_MODEL, ModelRouter
+
+COMPARISON = "Compare the soil of Kerala versus Tamil Nadu"
+
+
+def test_latency_spike_only_keeps_a_model_out_for_a_while():
+    router = ModelRouter(latency_budget=8.0, recovery_half_life=60.0)
+    assert router.route(COMPARISON).model == STRONG_MODEL
+
+    with mock.patch("model_router.time.time", return_value=1000.0):
+        router.record(STRONG_MODEL, 60.0)
+    with mock.patch("model_router.time.time", return_value=1010.0):
+        spiked = router.route(COMPARISON)
+    assert spiked.model != STRONG_MODEL
+
+    # Unused, the estimate decays toward the 5s prior and the model fits the budget again
+    with mock.patch("model_router.time.time", return_value=1000.0 + 6 * 60.0):
+        recovered = router.route(COMPARISON)
+    assert recovered.model == STRONG_MODEL
+    assert recovered.expected_latency < 8.0
+
+
+def test_recorded_latencies_follow_observations():
+    router = ModelRouter()
+    router.record(FAST_MODEL, 1.0)
+    expected = router.expected_latency(FAST_MODEL)
+    assert 1.0 < expected < DEFAULT_LATENCIES[FAST_MODEL]
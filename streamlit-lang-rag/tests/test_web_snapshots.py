@@ -0,0 +1,95 @@
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from web_snapshots import WebSnapshotStore
+
+
+class LocalPageServer:
+    """In-process HTTP server for a dict of {path: html}, honouring conditional requests.
+
+    Assign to server.pages to change a page; server.requests counts hits per path.
+    """
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.requests = {}
+        self._server = None
+        self._thread = None
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                owner.requests[self.path] = owner.requests.get(self.path, 0) + 1
+                page = owner.pages.get(self.path)
+                if page is None:
+                    self.send_error(404)
+                    return
+                body = page.encode('utf-8') if isinstance(page, str) else page
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", formatdate(usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def page_server():
+    with LocalPageServer({"/schemes": "<html><title>Schemes</title><body>PM-KISAN</body></html>"}) as server:
+        yield server
+
+
+def test_refresh_revalidates_with_conditional_requests(tmp_path, page_server):
+    store = WebSnapshotStore(tmp_path)
+    url = page_server.url("/schemes")
+
+    assert store.refresh([url]) == {url: "changed"}
+    assert store.refresh([url]) == {url: "not_modified"}
+
+    page_server.pages["/schemes"] = "<html><title>Schemes</title><body>PM-KISAN, PMFBY</body></html>"
+    assert store.refresh([url]) == {url: "changed"}
+    assert page_server.requests["/schemes"] == 3
+
+    [doc] = store.documents([url])
+    assert doc.metadata == {"source": url, "title": "Schemes"}
+    assert doc.page_content.endswith("PM-KISAN, PMFBY")
+
+
+def test_failed_fetch_keeps_the_snapshot(tmp_path, page_server):
+    store = WebSnapshotStore(tmp_path)
+    url = page_server.url("/schemes")
+    store.refresh([url])
+
+    del page_server.pages["/schemes"]
+    assert store.refresh([url]) == {url: "error"}
+    assert not store.is_stale(url)
+    assert store.documents([url])[0].page_content.endswith("PM-KISAN")
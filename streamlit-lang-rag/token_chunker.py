@@ -0,0 +1,150 @@
+"""
+Token-aware chunking with the embedding model's own tokenizer.
+
+Chunk sizes are measured in bge word pieces (``tokenizer.json`` from the
+model folder), not characters, so numeric tables and long compound terms can
+no longer produce chunks past the model's 512-token window that would be
+silently truncated at embedding time. Pieces the recursive splitter cannot
+break at a separator are cut at token offsets instead.
+
+Chunks keep the whitespace around them and the separator the splitter moves
+to the start of the next chunk, so every chunk is an exact slice of its
+document and neighbouring chunks join back into the source text (see
+``context_packer.join_overlapping``).
+
+``ChunkCache`` stores the chunk texts of every source document keyed by the
+document's content hash, so rebuilds only re-split documents that changed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from langchain.schema import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from tokenizers import Tokenizer
+
+# bge-small-en-v1.5 reads 512 tokens including [CLS] and [SEP]
+MAX_CHUNK_TOKENS = 510
+CHUNK_CACHE_FILE = "chunks.json"
+
+
+class TokenChunker:
+    """Recursive splitter whose chunk_size/chunk_overlap are counted in model tokens"""
+
+    def __init__(self, model_path, chunk_tokens: int, overlap_tokens: int, separators: list,
+                 max_tokens: int = MAX_CHUNK_TOKENS):
+        self.tokenizer = Tokenizer.from_file(str(Path(model_path) / "tokenizer.json"))
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+        self.chunk_tokens = min(chunk_tokens, max_tokens)
+        self.overlap_tokens = overlap_tokens
+        self.max_tokens = max_tokens
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_tokens,
+            chunk_overlap=overlap_tokens,
+            separators=separators,
+            length_function=self.count_tokens,
+            strip_whitespace=False
+        )
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def _split_at_tokens(self, text: str) -> list:
+        """Cut text into chunk_tokens windows at token offsets.
+
+        The first and last windows reach the ends of text, so no whitespace
+        is lost between it and its neighbouring chunks.
+        """
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+        step = max(self.chunk_tokens - self.overlap_tokens, 1)
+        pieces = []
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.chunk_tokens]
+            last = start + self.chunk_tokens >= len(offsets)
+            pieces.append(text[window[0][0] if start else 0:len(text) if last else window[-1][1]])
+            if last:
+                break
+        return pieces
+
+    def split_text(self, text: str) -> list:
+        chunks = []
+        # A lone separator the splitter emitted as a chunk of its own goes to the next chunk
+        pending = ""
+        for chunk in self.splitter.split_text(text):
+            chunk = pending + chunk
+            if not chunk.strip():
+                pending = chunk
+                continue
+            pending = ""
+            if self.count_tokens(chunk) > self.max_tokens:
+                chunks.extend(self._split_at_tokens(chunk))
+            else:
+                chunks.append(chunk)
+        if pending and chunks:
+            chunks[-1] += pending
+        return chunks
+
+
+def document_key(document: Document) -> str:
+    """Content hash of a source document (text and metadata)"""
+    payload = document.page_content + "\x00" + json.dumps(document.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChunkCache:
+    """Chunk texts per source document, valid for one chunker configuration"""
+
+    def __init__(self, cache_dir, settings: dict):
+        self.path = Path(cache_dir) / CHUNK_CACHE_FILE
+        self.settings_key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+        self.entries = {}
+        self.last_stats = None
+
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get("settings_key") == self.settings_key:
+                    self.entries = cached.get("documents", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def split_documents(self, documents: list, chunker: TokenChunker) -> list:
+        """Chunk documents, splitting only the ones not in the cache.
+
+        Each chunk records its position within its document as chunk_index.
+        Entries for documents that are no longer passed in are dropped.
+        """
+        entries = {}
+        hits = 0
+        chunks = []
+        for document in documents:
+            key = document_key(document)
+            texts = entries.get(key) or self.entries.get(key)
+            if texts is None:
+                texts = chunker.split_text(document.page_content)
+            else:
+                hits += 1
+            entries[key] = texts
+            chunks.extend(
+                Document(page_content=text, metadata=dict(document.metadata, chunk_index=index))
+                for index, text in enumerate(texts)
+            )
+
+        self.entries = entries
+        self.last_stats = {"documents": len(documents), "cached": hits, "split": len(documents) - hits}
+        return chunks
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".chunks.")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"settings_key": self.settings_key, "documents": self.entries}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,212 @@
+"""
+On-disk snapshots of the farmer scheme web pages.
+
+Queries and index builds read pages from the snapshot store only, so the app
+never waits on the network and a site outage does not empty the schemes
+corpus. Snapshots are revalidated stale-while-revalidate: once a page is
+older than ``max_age`` the stale copy keeps being served while a background
+thread re-fetches all stale pages concurrently with aiohttp, using
+ETag/Last-Modified conditional requests so unchanged pages cost a 304.
+
+Layout of the snapshot directory::
+
+    pages/<key>.html   page bodies (fingerprinted by the index manifest)
+    state/<key>.json   url, validators and fetch/check timestamps
+
+Bodies are only rewritten when they change, so revalidation alone never
+triggers an index rebuild.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import aiohttp
+from bs4 import BeautifulSoup
+from langchain.schema import Document
+
+PAGES_DIR = "pages"
+STATE_DIR = "state"
+
+# Serve a snapshot this long before revalidating it
+DEFAULT_MAX_AGE = 3600
+# Wait this long before retrying a page whose last fetch failed
+RETRY_AFTER = 300
+FETCH_TIMEOUT = 20
+USER_AGENT = "Mozilla/5.0 (compatible; agri-rag-snapshot/1.0)"
+
+logger = logging.getLogger(__name__)
+
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class WebSnapshotStore:
+    """Snapshot store for a fixed list of web pages"""
+
+    def __init__(self, snapshot_dir, max_age: float = DEFAULT_MAX_AGE, timeout: float = FETCH_TIMEOUT,
+                 concurrency: int = 8):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.last_results = {}
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+    @property
+    def pages_dir(self) -> Path:
+        return self.snapshot_dir / PAGES_DIR
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+
+    def _page_path(self, url: str) -> Path:
+        return self.pages_dir / f"{self._key(url)}.html"
+
+    def _state_path(self, url: str) -> Path:
+        return self.snapshot_dir / STATE_DIR / f"{self._key(url)}.json"
+
+    def read_state(self, url: str) -> dict:
+        try:
+            with open(self._state_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, url: str, state: dict):
+        _atomic_write(self._state_path(url), json.dumps(state, indent=2).encode('utf-8'))
+
+    def read_page(self, url: str):
+        """Snapshot body of url, or None if it was never fetched"""
+        try:
+            return self._page_path(url).read_bytes()
+        except OSError:
+            return None
+
+    def _write_page(self, url: str, body: bytes) -> bool:
+        """Store body, returning True if it differs from the snapshot"""
+        if self.read_page(url) == body:
+            return False
+        _atomic_write(self._page_path(url), body)
+        return True
+
+    def is_stale(self, url: str, now: float = None) -> bool:
+        now = now or time.time()
+        state = self.read_state(url)
+        if state.get("failed_at") and now - state["failed_at"] < RETRY_AFTER:
+            return False
+        if self.read_page(url) is None:
+            return True
+        return now - state.get("checked_at", 0) >= self.max_age
+
+    # --- Refresh ---
+    async def _refresh_one(self, session: aiohttp.ClientSession, url: str) -> str:
+        state = self.read_state(url)
+        headers = {}
+        if self.read_page(url) is not None:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        now = time.time()
+        state["url"] = url
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    status = "not_modified"
+                else:
+                    response.raise_for_status()
+                    body = await response.read()
+                    status = "changed" if self._write_page(url, body) else "unchanged"
+                    state["etag"] = response.headers.get("ETag")
+                    state["last_modified"] = response.headers.get("Last-Modified")
+                    state["fetched_at"] = now
+            state["checked_at"] = now
+            state.pop("failed_at", None)
+            state.pop("error", None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Keep serving the old snapshot; retry after RETRY_AFTER
+            status = "error"
+            state["failed_at"] = now
+            state["error"] = str(e) or type(e).__name__
+
+        self._write_state(url, state)
+        return status
+
+    async def refresh_async(self, urls: list) -> dict:
+        """Conditionally re-fetch urls concurrently; returns {url: status}"""
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT}
+        ) as session:
+            statuses = await asyncio.gather(*(self._refresh_one(session, url) for url in urls))
+        self.last_results = dict(zip(urls, statuses))
+        return self.last_results
+
+    def refresh(self, urls: list) -> dict:
+        """Blocking refresh, for offline builds"""
+        return asyncio.run(self.refresh_async(urls))
+
+    def revalidate_in_background(self, urls: list) -> bool:
+        """Start a background refresh of the stale urls unless one is running.
+
+        Returns True if a refresh was started.
+        """
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return False
+            stale = [url for url in urls if self.is_stale(url)]
+            if not stale:
+                return False
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_quietly, args=(stale,), name="web-snapshot-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+            return True
+
+    def _refresh_quietly(self, urls: list):
+        try:
+            results = self.refresh(urls)
+            logger.info("Web snapshots refreshed: %s", results)
+        except Exception as e:
+            logger.warning("Web snapshot refresh failed: %s", e)
+
+    # --- Documents ---
+    def documents(self, urls: list) -> list:
+        """Documents for every url that has a snapshot, in WebBaseLoader's shape"""
+        documents = []
+        for url in urls:
+            body = self.read_page(url)
+            if body is None:
+                continue
+            soup = BeautifulSoup(body, "html.parser")
+            metadata = {"source": url}
+            if soup.title and soup.title.string:
+                metadata["title"] = soup.title.string.strip()
+            description = soup.find("meta", attrs={"name": "description"})
+            if description and description.get("content"):
+                metadata["description"] = description["content"]
+            if soup.html and soup.html.get("lang"):
+                metadata["language"] = soup.html["lang"]
+            documents.append(Document(page_content=soup.get_text(" ", strip=True), metadata=metadata))
+        return documents
+